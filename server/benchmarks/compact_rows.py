@@ -0,0 +1,50 @@
+"""Compare dict rows with CompactRows for a large listing: Python allocations
+while fetching and the size of the JSON payload.
+
+Usage (from the server directory, against a seeded database):
+    python -m benchmarks.compact_rows [doctor_id]
+"""
+import sys
+import tracemalloc
+from db_connection import DbPool
+from main import app
+from queries.appointment import AppointmentQueryManager
+from utils.responses import serialize_rows
+
+def measure(doctor_id, compact):
+    with DbPool.cursor(readonly=True) as cur:
+        appointment_manager = AppointmentQueryManager(cur)
+        tracemalloc.start()
+        rows = appointment_manager.get_appointments_by_doctor(doctor_id, compact=compact)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    with app.app_context():
+        payload = app.json.dumps({"status": "success", "appointments": serialize_rows(rows)})
+    return len(rows), peak, len(payload.encode('utf-8'))
+
+def main():
+    if len(sys.argv) > 1:
+        doctor_id = int(sys.argv[1])
+    else:
+        with DbPool.cursor(readonly=True) as cur:
+            cur.execute("SELECT doctor_id FROM appointments GROUP BY doctor_id ORDER BY COUNT(*) DESC LIMIT 1")
+            row = cur.fetchone()
+        if not row:
+            print("✗ No appointments found, seed the database first")
+            sys.exit(1)
+        doctor_id = row['doctor_id']
+
+    count, dict_peak, dict_payload = measure(doctor_id, compact=False)
+    _, compact_peak, compact_payload = measure(doctor_id, compact=True)
+
+    print(f"doctor {doctor_id}: {count} appointments")
+    print(f"   dicts: peak {dict_peak / 1024:.1f} KiB, payload {dict_payload / 1024:.1f} KiB")
+    print(f" compact: peak {compact_peak / 1024:.1f} KiB, payload {compact_payload / 1024:.1f} KiB")
+    if dict_peak and dict_payload:
+        print(f"reduction: allocations {100 * (1 - compact_peak / dict_peak):.0f}%, payload {100 * (1 - compact_payload / dict_payload):.0f}%")
+
+    DbPool.closeall()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Hold many idle notification streams open against a running server, then
+publish one notification to each stream's user and measure how fast it
+arrives. All streams are driven by one thread over non-blocking sockets.
+
+Usage (from the server directory, with the server and Redis running):
+    ulimit -n 10000
+    python -m benchmarks.notification_stream [streams] [idle_seconds] [server_url]
+"""
+import datetime as dt
+import selectors
+import socket
+import sys
+import time
+from urllib.parse import urlparse
+from redis_connection import RedisClient
+from services.auth_service import AuthService
+from services.notification_service import NotificationService
+
+# Far above any real user id, so no real user gets the test notifications
+USER_ID_OFFSET = 10 ** 9
+CONNECT_TIMEOUT = 60
+DELIVERY_TIMEOUT = 30
+
+class Streams:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+        self.tails = {}
+        self.opened = set()
+        self.closed = set()
+        self.received_at = {}
+
+    def open(self, index, token):
+        sock = socket.create_connection((self.host, self.port))
+        sock.sendall((
+            f"GET /notification/stream HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n"
+        ).encode())
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, index)
+        self.sockets.append(sock)
+        self.tails[index] = b''
+
+    def pump(self, seconds, done=lambda: False):
+        """Read whatever arrives for up to `seconds`, or until `done()`."""
+        deadline = time.perf_counter() + seconds
+        while not done():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            for key, _ in self.selector.select(timeout=min(remaining, 0.5)):
+                index = key.data
+                try:
+                    data = key.fileobj.recv(65536)
+                except ConnectionError:
+                    data = b''
+                if not data:
+                    self.closed.add(index)
+                    self.selector.unregister(key.fileobj)
+                    continue
+                # Keep a short tail so a marker split across reads is still found
+                seen = self.tails[index] + data
+                if b' 200 ' in seen[:32]:
+                    self.opened.add(index)
+                if index not in self.received_at and b'event: notification' in seen:
+                    self.received_at[index] = time.perf_counter()
+                self.tails[index] = seen[-32:]
+
+    def close(self):
+        for sock in self.sockets:
+            sock.close()
+        self.selector.close()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    idle_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    server = urlparse(sys.argv[3] if len(sys.argv) > 3 else "http://localhost:5000")
+
+    redis_client = RedisClient.get_client()
+    if not redis_client:
+        print("✗ Redis is not reachable")
+        sys.exit(1)
+
+    tokens = [AuthService.create_session(USER_ID_OFFSET + index, 'user', expiry_hours=1) for index in range(count)]
+    streams = Streams(server.hostname, server.port or 80)
+    try:
+        started = time.perf_counter()
+        for index, token in enumerate(tokens):
+            streams.open(index, token)
+            streams.pump(0)
+        streams.pump(CONNECT_TIMEOUT, lambda: len(streams.opened) + len(streams.closed) >= count)
+        print(f"{len(streams.opened)}/{count} streams open in {time.perf_counter() - started:.1f}s")
+
+        streams.pump(idle_seconds)
+        alive = len(streams.opened - streams.closed)
+        print(f"{'✓' if alive == count else '✗'} {alive}/{count} streams still open after {idle_seconds:.0f}s idle")
+
+        now = dt.datetime.now()
+        published_at = time.perf_counter()
+        NotificationService.publish([
+            {
+                "id": index,
+                "user_id": USER_ID_OFFSET + index,
+                "type": "general_notification",
+                "title": "benchmark",
+                "content": "benchmark: notification_stream",
+                "is_read": False,
+                "created_at": now,
+            }
+            for index in range(count)
+        ])
+        streams.pump(DELIVERY_TIMEOUT, lambda: len(streams.received_at) >= alive)
+
+        latencies = sorted(received - published_at for received in streams.received_at.values())
+        print(f"{'✓' if len(latencies) == alive else '✗'} {len(latencies)}/{alive} notifications delivered")
+        if latencies:
+            print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    finally:
+        streams.close()
+        for token in tokens:
+            AuthService.delete_session(token)
+
+    if len(streams.received_at) < count:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
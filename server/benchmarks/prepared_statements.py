@@ -0,0 +1,69 @@
+"""Compare plain vs prepared execution of the hot lookup statements.
+
+Usage (from the server directory, against a seeded database):
+    python -m benchmarks.prepared_statements [iterations]
+"""
+import sys
+import time
+from db_connection import DbPool, PreparedStatement
+from queries.user import UserQueryManager, GET_DOCTOR
+from queries.appointment import AppointmentQueryManager
+
+def run_lookups(iterations, doctor_ids, user_ids, availability_ids):
+    with DbPool.cursor(readonly=True) as cur:
+        user_manager = UserQueryManager(cur)
+        appointment_manager = AppointmentQueryManager(cur)
+        started = time.perf_counter()
+        for i in range(iterations):
+            user_manager.get_doctor(doctor_ids[i % len(doctor_ids)])
+            user_manager.get_user_by_id(user_ids[i % len(user_ids)])
+            appointment_manager.get_availability_by_id(availability_ids[i % len(availability_ids)])
+        return time.perf_counter() - started
+
+def planning_time_ms(statement, params, prepared):
+    with DbPool.cursor(commit=False) as cur:
+        sql = statement.sql
+        if prepared:
+            # EXPLAIN EXECUTE needs the statement prepared on this very connection
+            cur.execute_prepared(statement, params)
+            cur.fetchall()
+            sql = statement.execute_sql
+        cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+        return cur.fetchone()['QUERY PLAN'][0]['Planning Time']
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with DbPool.cursor(readonly=True) as cur:
+        cur.execute("SELECT id, user_id FROM doctors")
+        doctors = cur.fetchall()
+        cur.execute("SELECT id FROM doctor_availability LIMIT 100")
+        availability_ids = [row['id'] for row in cur.fetchall()]
+
+    if not doctors or not availability_ids:
+        print("✗ Seed the database first: python seed_database.py")
+        sys.exit(1)
+
+    doctor_ids = [row['id'] for row in doctors]
+    user_ids = [row['user_id'] for row in doctors]
+
+    results = {}
+    for enabled in (False, True):
+        PreparedStatement.enabled = enabled
+        run_lookups(100, doctor_ids, user_ids, availability_ids)  # warm up
+        results[enabled] = run_lookups(iterations, doctor_ids, user_ids, availability_ids)
+
+    statements = iterations * 3
+    for enabled, elapsed in results.items():
+        label = "prepared" if enabled else "plain"
+        print(f"{label:>8}: {statements} statements in {elapsed:.3f}s ({elapsed / statements * 1e6:.1f} µs/statement)")
+    print(f"speedup: {results[False] / results[True]:.2f}x")
+
+    plain_planning = planning_time_ms(GET_DOCTOR, (doctor_ids[0],), prepared=False)
+    prepared_planning = planning_time_ms(GET_DOCTOR, (doctor_ids[0],), prepared=True)
+    print(f"planning time for {GET_DOCTOR.name}: plain {plain_planning:.3f} ms, prepared {prepared_planning:.3f} ms")
+
+    DbPool.closeall()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Insert prescriptions from many threads at once and check that every one
+got a distinct code of at least CODE_MINIMAL_VALUE.
+
+Usage (from the server directory, against a seeded database):
+    DB_POOL_MAX=20 python -m benchmarks.prescription_codes [inserts] [workers]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db_connection import DbPool
+from queries.prescription import PrescriptionQueryManager, CODE_MINIMAL_VALUE
+
+NOTES = "benchmark: prescription_codes"
+
+def insert(doctor_id, patient_id):
+    started = time.perf_counter()
+    try:
+        with DbPool.cursor() as cur:
+            PrescriptionQueryManager(cur).create_prescription(
+                doctor_id=doctor_id,
+                patient_id=patient_id,
+                notes=NOTES,
+                prescription_items=[{"medication_name": "Placebo", "dosage": "1x1"}],
+            )
+        outcome = "inserted"
+    except Exception as e:
+        outcome = f"error: {type(e).__name__}"
+    return outcome, time.perf_counter() - started
+
+def main():
+    inserts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with DbPool.cursor(readonly=True) as cur:
+        cur.execute("SELECT id FROM doctors LIMIT 1")
+        doctor = cur.fetchone()
+        cur.execute("SELECT id FROM patients LIMIT 1")
+        patient = cur.fetchone()
+
+    if not doctor or not patient:
+        print("✗ Seed the database first: python seed_database.py")
+        sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda _: insert(doctor['id'], patient['id']), range(inserts)))
+        elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+
+    with DbPool.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) AS total, count(DISTINCT code) AS distinct_codes, min(code) AS min_code FROM prescriptions WHERE notes = %s",
+            (NOTES,)
+        )
+        codes = cur.fetchone()
+        cur.execute("DELETE FROM prescriptions WHERE notes = %s", (NOTES,))
+
+    print(f"{inserts} prescriptions with {workers} workers in {elapsed:.3f}s ({inserts / elapsed:.0f} inserts/s)")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome}: {count}")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+    ok = codes['total'] == inserts and codes['distinct_codes'] == inserts and (codes['min_code'] or 0) >= CODE_MINIMAL_VALUE
+    print(f"{'✓' if ok else '✗'} {codes['distinct_codes']} distinct codes for {codes['total']} rows, lowest {codes['min_code']}")
+
+    DbPool.closeall()
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Latency of the pharmacy lookup by prescription code, straight from the
+database vs. served from the Redis cache.
+
+Usage (from the server directory, against a seeded database and Redis):
+    python -m benchmarks.prescription_lookup [iterations]
+"""
+import sys
+import time
+from db_connection import DbPool
+from main import app
+from queries.prescription import PrescriptionQueryManager
+from redis_connection import RedisClient
+from services.prescription_cache_service import PrescriptionCacheService
+
+def load(code):
+    with DbPool.cursor(readonly=True, replica=False) as cur:
+        return PrescriptionQueryManager(cur).get_prescription_by_code(code)
+
+def measure(iterations, codes, lookup):
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        lookup(codes[i % len(codes)])
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies
+
+def report(label, latencies):
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"{label:>9}: p50 {p50:.0f} µs, p99 {p99:.0f} µs, {len(latencies) / sum(latencies):.0f} lookups/s")
+    return p50
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with DbPool.cursor(readonly=True) as cur:
+        cur.execute("SELECT code FROM prescriptions LIMIT 100")
+        codes = [row['code'] for row in cur.fetchall()]
+
+    if not codes:
+        print("✗ Seed the database first: python seed_database.py")
+        sys.exit(1)
+    if not RedisClient.get_client():
+        print("✗ Redis is not reachable")
+        sys.exit(1)
+
+    with app.app_context():
+        for code in codes:
+            PrescriptionCacheService.invalidate(code)
+        measure(100, codes, load)  # warm up connections and prepared statements
+        uncached = report("uncached", measure(iterations, codes, load))
+
+        cached_lookup = lambda code: PrescriptionCacheService.get_or_load(code, lambda: load(code))
+        measure(len(codes), codes, cached_lookup)  # fill the cache
+        cached = report("cached", measure(iterations, codes, cached_lookup))
+
+    print(f"speedup: {uncached / cached:.2f}x")
+    DbPool.closeall()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Hammer one availability slot with concurrent bookings and check that
+exactly one of them wins.
+
+Usage (from the server directory, against a seeded database):
+    DB_POOL_MAX=50 python -m benchmarks.slot_booking [attempts] [workers]
+"""
+import datetime as dt
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db_connection import DbPool
+from queries.appointment import AppointmentQueryManager, SlotUnavailableError
+
+def create_slot(doctor_id):
+    # A random far-future hour keeps clear of existing slots and earlier runs
+    start = dt.datetime(2100, 1, 1) + dt.timedelta(hours=random.randrange(24 * 365 * 50))
+    with DbPool.cursor() as cur:
+        return AppointmentQueryManager(cur).create_doctor_availability(
+            doctor_id=doctor_id,
+            start_time=start,
+            end_time=start + dt.timedelta(minutes=30),
+            is_available=True,
+        )
+
+def book(patient_id, doctor_id, availability_id):
+    started = time.perf_counter()
+    try:
+        with DbPool.cursor() as cur:
+            AppointmentQueryManager(cur).create_appointment(
+                patient_id=patient_id,
+                doctor_id=doctor_id,
+                availability_id=availability_id,
+            )
+        outcome = "booked"
+    except SlotUnavailableError:
+        outcome = "unavailable"
+    except Exception as e:
+        outcome = f"error: {e}"
+    return outcome, time.perf_counter() - started
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with DbPool.cursor(readonly=True) as cur:
+        cur.execute("SELECT id FROM doctors LIMIT 1")
+        doctor = cur.fetchone()
+        cur.execute("SELECT id FROM patients")
+        patient_ids = [row['id'] for row in cur.fetchall()]
+
+    if not doctor or not patient_ids:
+        print("✗ Seed the database first: python seed_database.py")
+        sys.exit(1)
+
+    availability_id = create_slot(doctor['id'])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(
+            lambda i: book(patient_ids[i % len(patient_ids)], doctor['id'], availability_id),
+            range(attempts),
+        ))
+        elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+
+    with DbPool.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) AS booked FROM appointments WHERE availability_id = %s AND status = 'scheduled'",
+            (availability_id,)
+        )
+        booked = cur.fetchone()['booked']
+        cur.execute("DELETE FROM appointments WHERE availability_id = %s", (availability_id,))
+        cur.execute("DELETE FROM doctor_availability WHERE id = %s", (availability_id,))
+
+    print(f"{attempts} bookings of slot {availability_id} with {workers} workers in {elapsed:.3f}s ({attempts / elapsed:.0f} bookings/s)")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome}: {count}")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"{'✓' if booked == 1 else '✗'} scheduled appointments for the slot: {booked}")
+
+    DbPool.closeall()
+    if booked != 1:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
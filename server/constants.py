@@ -14,6 +14,7 @@ class AppointmentTables(Enum):
     DOCTOR_AVAILABILITY = 'doctor_availability'
     PRESCRIPTIONS = 'prescriptions'
     PRESCRIPTION_ITEMS = 'prescription_items'
+    APPOINTMENT_REMINDERS = 'appointment_reminders'
 
 class AppointmentStatus(Enum):
     SCHEDULED = 'scheduled'
@@ -35,6 +36,7 @@ specializations = {
 }
 
 NOTIFICATION_TABLE = 'notifications'
+NOTIFICATION_OUTBOX_TABLE = 'notification_outbox'
 
 class NotificationType(Enum):
     APPOINTMENT_REMINDER = 'appointment_reminder'
@@ -1,17 +1,40 @@
 from flask import Blueprint, request, jsonify, g
-from queries.appointment import AppointmentQueryManager
+from queries.appointment import AppointmentQueryManager, SlotUnavailableError
 from queries.user import UserQueryManager
 from db_connection import DbPool
 from constants import UserRole, AppointmentStatus
 from middleware.auth import role_required, token_required
+from middleware.query_budget import query_budget
+from middleware.request_deadline import request_timeout
 from services.notification_service import NotificationService
+from services.slot_hold_service import SlotHoldService
+from utils.responses import stream_json_list, serialize_rows
+from utils.pagination import paginate
+from utils.params import parse_page
+import datetime as dt
 
 bp = Blueprint('appointment', __name__)
 
+PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+def appointment_page(appointments, limit):
+    appointments, next_cursor, has_more = paginate(appointments, limit, lambda a: (a['appointment_date'], a['id']))
+    return jsonify({
+        "status": "success",
+        "appointments": serialize_rows(appointments),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }), 200
+
 @bp.post('/')
 @token_required
 def create_appointment():
     data = request.get_json() or {}
+    # A slot held by another session is refused before touching Postgres
+    holder = SlotHoldService.holder(data.get('availability_id'))
+    if holder is not None and holder != SlotHoldService.session_id(g.token):
+        return jsonify({"status": "error", "message": "The selected availability slot is held by another patient"}), 409
     try:
         with DbPool.cursor() as cur:
             user_manager = UserQueryManager(cur)
@@ -27,6 +50,10 @@ def create_appointment():
                     return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             appointment_id = appointment_manager.create_appointment(**data)
+            if holder is not None:
+                # Only once the booking is committed; a failed commit keeps the hold
+                availability_id, token = data.get('availability_id'), g.token
+                DbPool.on_commit(lambda: SlotHoldService.release(availability_id, token))
 
             if appointment_id and g.role != UserRole.USER.value:
                 appointment = appointment_manager.get_appointment(appointment_id)
@@ -40,6 +67,8 @@ def create_appointment():
                 )
 
         return jsonify({"status": "success", "appointment_id": appointment_id}), 201
+    except SlotUnavailableError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
@@ -49,7 +78,7 @@ def get_appointment(appointment_id):
     if not appointment_id:
         return jsonify({"status": "error", "message": "No appointment ID provided"}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             appointment_manager = AppointmentQueryManager(cur)
             appointment = appointment_manager.get_appointment(appointment_id)
@@ -70,12 +99,18 @@ def get_appointment(appointment_id):
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/patient/<int:patient_id>')
+@query_budget(2)
 @role_required(UserRole.ADMIN.value, UserRole.USER.value)
 def get_appointments_by_patient(patient_id):
     if not patient_id:
         return jsonify({"status": "error", "message": "No patient ID provided"}), 400
+    compact = request.args.get('format') == 'columns'
     try:
-        with DbPool.cursor() as cur:
+        limit, after = parse_page(request.args, PAGE_LIMIT, MAX_PAGE_LIMIT, dt.datetime, int)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient(patient_id)
 
@@ -83,19 +118,21 @@ def get_appointments_by_patient(patient_id):
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             appointment_manager = AppointmentQueryManager(cur)
-            appointments = appointment_manager.get_appointments_by_patient(patient_id)
+            appointments = appointment_manager.get_appointments_by_patient(patient_id, compact=compact, limit=limit, after=after)
 
-        return jsonify({"status": "success", "appointments": appointments}), 200
+        return appointment_page(appointments, limit)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/patient/<int:patient_id>/upcoming')
+@query_budget(2)
 @role_required(UserRole.ADMIN.value, UserRole.USER.value)
 def get_upcoming_appointments_by_patient(patient_id):
     if not patient_id:
         return jsonify({"status": "error", "message": "No patient ID provided"}), 400
+    compact = request.args.get('format') == 'columns'
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient(patient_id)
 
@@ -103,19 +140,25 @@ def get_upcoming_appointments_by_patient(patient_id):
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             appointment_manager = AppointmentQueryManager(cur)
-            appointments = appointment_manager.get_upcoming_appointments_by_patient(patient_id)
+            appointments = appointment_manager.get_upcoming_appointments_by_patient(patient_id, compact=compact)
 
-        return jsonify({"status": "success", "appointments": appointments}), 200
+        return jsonify({"status": "success", "appointments": serialize_rows(appointments)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/patient/<int:patient_id>/past')
+@query_budget(2)
 @token_required
 def get_past_appointments_by_patient(patient_id):
     if not patient_id:
         return jsonify({"status": "error", "message": "No patient ID provided"}), 400
+    compact = request.args.get('format') == 'columns'
     try:
-        with DbPool.cursor() as cur:
+        limit, after = parse_page(request.args, PAGE_LIMIT, MAX_PAGE_LIMIT, dt.datetime, int)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient(patient_id)
 
@@ -123,22 +166,33 @@ def get_past_appointments_by_patient(patient_id):
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             appointment_manager = AppointmentQueryManager(cur)
-            appointments = appointment_manager.get_past_appointments_by_patient(patient_id)
+            appointments = appointment_manager.get_past_appointments_by_patient(patient_id, compact=compact, limit=limit, after=after)
 
-        return jsonify({"status": "success", "appointments": appointments}), 200
+        return appointment_page(appointments, limit)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/doctor/<int:doctor_id>')
+@query_budget(1)
+@request_timeout(30)
 @role_required(UserRole.ADMIN.value, UserRole.DOCTOR.value)
 def get_appointments_by_doctor(doctor_id):
     if not doctor_id:
         return jsonify({"status": "error", "message": "No doctor ID provided"}), 400
+    stream = request.args.get('stream', '').lower() == 'true'
+    compact = request.args.get('format') == 'columns'
     try:
-        with DbPool.cursor() as cur:
+        # A stream is the full export; everything else is one page
+        limit, after = (None, None) if stream else parse_page(request.args, PAGE_LIMIT, MAX_PAGE_LIMIT, dt.datetime, int)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        with DbPool.cursor(readonly=True) as cur:
             appointment_manager = AppointmentQueryManager(cur)
-            appointments = appointment_manager.get_appointments_by_doctor(doctor_id)
-        return jsonify({"status": "success", "appointments": appointments}), 200
+            appointments = appointment_manager.get_appointments_by_doctor(doctor_id, stream=stream, compact=compact, limit=limit, after=after)
+        if stream:
+            return stream_json_list("appointments", appointments)
+        return appointment_page(appointments, limit)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
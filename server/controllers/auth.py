@@ -19,7 +19,7 @@ def login():
         }), 400
     
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             user = user_manager.get_user_by_email(email)
             
@@ -109,7 +109,7 @@ def verify():
 @token_required
 def get_current_user():
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             user = user_manager.get_user_by_id(g.user_id)
             
@@ -3,11 +3,18 @@ from queries.appointment import AppointmentQueryManager
 from queries.user import UserQueryManager
 from db_connection import DbPool
 from middleware.auth import role_required, token_required
+from middleware.query_budget import query_budget
 from constants import UserRole, AppointmentStatus
 from services.notification_service import NotificationService
+from services.slot_hold_service import SlotHoldService, SLOT_HOLD_TTL_MS
+from utils.params import parse_date, parse_limit
 
 bp = Blueprint('availability', __name__)
 
+SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 500
+MAX_SEARCH_DAYS = 31
+
 @bp.post('/')
 @role_required(UserRole.ADMIN.value, UserRole.DOCTOR.value)
 def create_doctor_availability():
@@ -31,30 +38,51 @@ def create_doctor_availability():
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/doctor/<int:doctor_id>')
+@query_budget(1)
 @token_required
 def get_doctor_availability(doctor_id):
     if not doctor_id:
         return jsonify({"status": "error", "message": "No doctor ID provided"}), 400
     try:
-        with DbPool.cursor() as cur:
+        held = SlotHoldService.held_by_others(g.token)
+        with DbPool.cursor(readonly=True) as cur:
             appointment_manager = AppointmentQueryManager(cur)
-            availability = appointment_manager.get_doctor_availability(doctor_id)
+            availability = appointment_manager.get_doctor_availability(doctor_id, exclude_ids=held)
         return jsonify({"status": "success", "availability": availability}), 200
     except Exception as e:
         print(e)
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/')
+@query_budget(1)
 @token_required
 def get_availabilities_by_specialization_and_date():
     specialization = request.args.get('specialization')
     date = request.args.get('date')
-    if not specialization or not date:
-        return jsonify({"status": "error", "message": "Specialization and date are required"}), 400
+    from_date, to_date = request.args.get('from'), request.args.get('to')
+    if not specialization or not (date or from_date):
+        return jsonify({"status": "error", "message": "Specialization and date (or from/to) are required"}), 400
     try:
-        with DbPool.cursor() as cur:
+        if date:
+            from_date = to_date = parse_date(date, "date")
+        else:
+            from_date = parse_date(from_date, "from")
+            to_date = parse_date(to_date, "to") if to_date else from_date
+        if to_date < from_date:
+            raise ValueError("to must not be before from")
+        if (to_date - from_date).days >= MAX_SEARCH_DAYS:
+            raise ValueError(f"Search range is limited to {MAX_SEARCH_DAYS} days")
+        limit = parse_limit(request.args.get('limit'), SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        # Held slots are excluded in the query, so they don't eat into the limit
+        held = SlotHoldService.held_by_others(g.token)
+        with DbPool.cursor(readonly=True) as cur:
             appointment_manager = AppointmentQueryManager(cur)
-            availabilities = appointment_manager.get_availabilities_by_specialization_and_date(specialization, date)
+            availabilities = appointment_manager.get_availabilities_by_specialization_and_range(
+                specialization, from_date, to_date, limit, exclude_ids=held
+            )
 
             if not availabilities:
                 return jsonify({"status": "error", "message": "No availabilities found"}), 404
@@ -79,6 +107,35 @@ def get_availabilities_by_specialization_and_date():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
+@bp.post('/<int:availability_id>/hold')
+@query_budget(1)
+@token_required
+def hold_availability(availability_id):
+    try:
+        with DbPool.cursor(readonly=True) as cur:
+            appointment_manager = AppointmentQueryManager(cur)
+            availability = appointment_manager.get_availability_by_id(availability_id)
+        if not availability:
+            return jsonify({"status": "error", "message": "Availability not found"}), 404
+        if not availability['is_available']:
+            return jsonify({"status": "error", "message": "The selected availability slot is not available"}), 409
+
+        if not SlotHoldService.hold(availability_id, g.token):
+            return jsonify({"status": "error", "message": "The selected availability slot is held by another patient"}), 409
+        return jsonify({"status": "success", "availability_id": availability_id, "expires_in_ms": SLOT_HOLD_TTL_MS}), 201
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.delete('/<int:availability_id>/hold')
+@token_required
+def release_availability_hold(availability_id):
+    try:
+        if not SlotHoldService.release(availability_id, g.token):
+            return jsonify({"status": "error", "message": "No hold on this availability slot"}), 404
+        return jsonify({"status": "success", "availability_id": availability_id}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @bp.patch('/<int:availability_id>')
 @role_required(UserRole.ADMIN.value, UserRole.DOCTOR.value)
 def update_doctor_availability(availability_id):
@@ -3,15 +3,19 @@ from queries.user import UserQueryManager
 from constants import ErrorMessages, specializations, UserRole
 from db_connection import DbPool
 from middleware.auth import role_required, token_required
+from middleware.query_budget import query_budget
+from middleware.request_deadline import request_timeout
 
 bp = Blueprint('doctor', __name__)
 
 @bp.get('/<int:doctor_id>')
+@query_budget(1)
+@request_timeout(2)
 def get_doctor(doctor_id):
     if not doctor_id:
         return jsonify({"status": "error", "message": ErrorMessages.NO_USER_ID.value}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             doctor = user_manager.get_doctor(doctor_id)
             if not doctor:
@@ -32,7 +36,7 @@ def get_doctors_by_specialization(specialization):
     if not specialization:
         return jsonify({"status": "error", "message": "No specialization provided"}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             doctors = user_manager.get_doctors_by_specialization(specialization)
         return jsonify({"status": "success", "doctors": doctors}), 200
@@ -45,7 +49,7 @@ def search_doctors_by_name(name_query):
     if not name_query:
         return jsonify({"status": "error", "message": "No name query provided"}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             doctors = user_manager.get_doctors_by_name(name_query)
         return jsonify({"status": "success", "doctors": doctors}), 200
@@ -0,0 +1,38 @@
+from flask import Blueprint, jsonify
+from db_connection import DbPool
+from queries.notification import NotificationOutboxQueryManager
+from constants import UserRole
+from middleware.auth import role_required
+from middleware.request_deadline import request_timeout
+from services.notification_stream_service import NotificationStreamService
+
+bp = Blueprint('health', __name__)
+
+@bp.get('/db')
+@request_timeout(2)
+@role_required(UserRole.ADMIN.value)
+def get_db_pool_stats():
+    try:
+        return jsonify({"status": "success", "pools": DbPool.stats()}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.get('/streams')
+@role_required(UserRole.ADMIN.value)
+def get_notification_stream_stats():
+    """Notification streams open in this process and events dropped for
+    clients that fell behind."""
+    return jsonify({"status": "success", "streams": NotificationStreamService.stats()}), 200
+
+@bp.get('/outbox')
+@request_timeout(2)
+@role_required(UserRole.ADMIN.value)
+def get_notification_outbox_stats():
+    """Notification events waiting for the worker; a growing number means
+    the workers are falling behind."""
+    try:
+        with DbPool.cursor(readonly=True) as cur:
+            pending = NotificationOutboxQueryManager(cur).backlog()
+        return jsonify({"status": "success", "pending": pending}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
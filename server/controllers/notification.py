@@ -1,19 +1,56 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g
 from queries.notification import NotificationQueryManager
 from queries.user import UserQueryManager
 from db_connection import DbPool
 from constants import UserRole
 from middleware.auth import role_required, token_required
+from middleware.query_budget import query_budget
+from middleware.request_deadline import request_timeout
+from utils.responses import stream_json_list, serialize_rows
+from utils.pagination import paginate
+from utils.params import parse_page
+from services.unread_counter_service import UnreadCounterService
+from services.notification_stream_service import NotificationStreamService
+import datetime as dt
+import os
+import queue
+import time
 
 bp = Blueprint('notification', __name__)
 
+PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+MAX_BATCH_IDS = 500
+READ_RETENTION_DAYS = 30
+# A comment line every so often keeps idle streams from being cut by proxies
+STREAM_HEARTBEAT = float(os.getenv('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15))
+# Streams end after this long; the client reconnects, presenting its token again
+STREAM_MAX_DURATION = float(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', 3600))
+STREAM_RETRY_MS = 3000
+# Notifications replayed to a stream reconnecting with Last-Event-ID; a client
+# that missed more re-reads its inbox
+STREAM_REPLAY_LIMIT = 100
+
+def can_manage_inbox(user_id):
+    return g.user_id == user_id or g.role == UserRole.ADMIN.value
+
 @bp.get('/<int:user_id>')
+@query_budget(2)
+@request_timeout(30)
 @token_required
 def get_notifications(user_id):
     if g.user_id != user_id:
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    stream = request.args.get('stream', '').lower() == 'true'
+    compact = request.args.get('format') == 'columns'
+    unread = request.args.get('unread', '').lower() == 'true'
     try:
-        with DbPool.cursor() as cur:
+        # A stream is the full export; everything else is one page
+        limit, after = (None, None) if stream else parse_page(request.args, PAGE_LIMIT, MAX_PAGE_LIMIT, dt.datetime, int)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
 
             user = user_manager.get_user_by_id(user_id)
@@ -21,9 +58,90 @@ def get_notifications(user_id):
                 return jsonify({"status": "error", "message": "User not found"}), 404
             
             notification_manager = NotificationQueryManager(cur)
-            notifications = notification_manager.get_notifications_by_user(user_id)
+            notifications = notification_manager.get_notifications_by_user(
+                user_id, stream=stream, compact=compact, unread=unread, limit=limit, after=after
+            )
+
+        if stream:
+            return stream_json_list("notifications", notifications)
+        notifications, next_cursor, has_more = paginate(notifications, limit, lambda n: (n['created_at'], n['id']))
+        return jsonify({
+            "status": "success",
+            "notifications": serialize_rows(notifications),
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.get('/stream')
+@query_budget(1)
+@token_required
+def stream_notifications():
+    """Server-sent events: a `notification` event for each new notification
+    of the authenticated user, pushed through Redis pub/sub instead of
+    polling the inbox. A reconnect with Last-Event-ID first replays what was
+    missed from the inbox; after that the stream holds no database
+    connection."""
+    user_id = g.user_id
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_id = None
+    # Subscribed before the replay query, so nothing published in between is lost
+    messages = NotificationStreamService.subscribe(user_id)
+
+    replay = []
+    if last_id is not None:
+        try:
+            with DbPool.cursor(readonly=True) as cur:
+                replay = NotificationQueryManager(cur).get_notifications_after(user_id, last_id, STREAM_REPLAY_LIMIT)
+        except Exception as e:
+            NotificationStreamService.unsubscribe(user_id, messages)
+            return jsonify({"status": "error", "message": str(e)}), 500
+        last_id = replay[-1]['id'] if replay else last_id
 
-        return jsonify({"status": "success", "notifications": notifications}), 200
+    def generate():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            for notification in replay:
+                # The same shape NotificationService.publish sends
+                yield NotificationStreamService.format_event({**notification, "created_at": notification['created_at'].isoformat()})
+            ends_at = time.monotonic() + STREAM_MAX_DURATION
+            while True:
+                remaining = ends_at - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    notification_id, event = messages.get(timeout=min(STREAM_HEARTBEAT, remaining))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                # Already sent by the replay
+                if last_id is None or notification_id > last_id:
+                    yield event
+        finally:
+            NotificationStreamService.unsubscribe(user_id, messages)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@bp.get('/<int:user_id>/unread-count')
+@query_budget(1)
+@token_required
+def get_unread_count(user_id):
+    if g.user_id != user_id:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    def count_unread():
+        with DbPool.cursor(readonly=True) as cur:
+            return NotificationQueryManager(cur).count_unread(user_id)
+
+    try:
+        # Served from Redis; Postgres is only counted when the counter is missing
+        return jsonify({"status": "success", "unread": UnreadCounterService.get(user_id, count_unread)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
@@ -43,7 +161,65 @@ def mark_notification_as_read(notification_id):
             if not isAdmin and notification['user_id'] != g.user_id:
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
-            notification_manager.mark_notification_as_read(notification_id)
+            # Deleted since it was read above
+            if notification_manager.mark_notification_as_read(notification_id) is None:
+                return jsonify({"status": "error", "message": "Notification not found"}), 404
         return jsonify({"status": "success", "message": "Notification marked as read"}), 200
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.post('/<int:user_id>/read-all')
+@query_budget(1)
+@token_required
+def mark_all_notifications_as_read(user_id):
+    if not can_manage_inbox(user_id):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    try:
+        with DbPool.cursor() as cur:
+            notification_ids = NotificationQueryManager(cur).mark_all_as_read(user_id)
+        return jsonify({"status": "success", "notification_ids": notification_ids}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.post('/<int:user_id>/read-batch')
+@query_budget(1)
+@token_required
+def mark_notifications_as_read(user_id):
+    if not can_manage_inbox(user_id):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    notification_ids = (request.get_json(silent=True) or {}).get('notification_ids')
+    if (
+        not isinstance(notification_ids, list)
+        or not notification_ids
+        or not all(isinstance(i, int) and not isinstance(i, bool) for i in notification_ids)
+    ):
+        return jsonify({"status": "error", "message": "notification_ids must be a non-empty list of integers"}), 400
+    if len(notification_ids) > MAX_BATCH_IDS:
+        return jsonify({"status": "error", "message": f"At most {MAX_BATCH_IDS} notification_ids per request"}), 400
+    try:
+        with DbPool.cursor() as cur:
+            # Ids that are not the user's, or already read, are skipped
+            notification_ids = NotificationQueryManager(cur).mark_as_read(user_id, notification_ids)
+        return jsonify({"status": "success", "notification_ids": notification_ids}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.delete('/<int:user_id>/read')
+@query_budget(1)
+@token_required
+def delete_read_notifications(user_id):
+    if not can_manage_inbox(user_id):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    try:
+        older_than_days = int(request.args.get('older_than_days', READ_RETENTION_DAYS))
+        if older_than_days < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"status": "error", "message": "older_than_days must be a non-negative integer"}), 400
+    try:
+        older_than = dt.datetime.now() - dt.timedelta(days=older_than_days)
+        with DbPool.cursor() as cur:
+            notification_ids = NotificationQueryManager(cur).delete_read_notifications(user_id, older_than)
+        return jsonify({"status": "success", "deleted": len(notification_ids)}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -12,7 +12,7 @@ def get_patient(patient_id):
     if not patient_id:
         return jsonify({"status": "error", "message": ErrorMessages.NO_USER_ID.value}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient(patient_id)
             if not patient:
@@ -5,10 +5,30 @@ from queries.user import UserQueryManager
 from db_connection import DbPool
 from constants import UserRole
 from middleware.auth import token_required, role_required
+from middleware.query_budget import query_budget
 from services.notification_service import NotificationService
+from services.prescription_cache_service import PrescriptionCacheService
+from utils.responses import stream_json_list, serialize_rows
+from utils.pagination import paginate
+from utils.params import parse_page
+import datetime as dt
 
 bp = Blueprint('prescription', __name__)
 
+PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+def parse_items_page(args):
+    """(limit, after) of an `?include=items` listing. That mode is paginated
+    JSON, so it cannot be combined with `?stream=true` or `?format=columns`."""
+    if args.get('stream', '').lower() == 'true' or args.get('format') == 'columns':
+        raise ValueError("include=items cannot be combined with stream=true or format=columns")
+    return parse_page(args, PAGE_LIMIT, MAX_PAGE_LIMIT, dt.datetime, int)
+
+def prescription_page(prescriptions, limit):
+    prescriptions, next_cursor, has_more = paginate(prescriptions, limit, lambda p: (p['issued_at'], p['id']))
+    return jsonify({"status": "success", "prescriptions": prescriptions, "next_cursor": next_cursor, "has_more": has_more}), 200
+
 @bp.post('/create')
 @role_required(UserRole.DOCTOR.value, UserRole.ADMIN.value)
 def create_prescription():
@@ -59,7 +79,7 @@ def get_prescription(prescription_id):
     if not prescription_id:
         return jsonify({"status": "error", "message": "No prescription ID provided"}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             prescription_manager = PrescriptionQueryManager(cur)
             user_manager = UserQueryManager(cur)
             prescription = prescription_manager.get_prescription(prescription_id)
@@ -80,13 +100,48 @@ def get_prescription(prescription_id):
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
+@bp.get('/code/<int:code>')
+@query_budget(1)
+@token_required
+def get_prescription_by_code(code):
+    def load():
+        # Never the replica: a lagging one would cache a deleted prescription
+        with DbPool.cursor(readonly=True, replica=False) as cur:
+            return PrescriptionQueryManager(cur).get_prescription_by_code(code)
+
+    try:
+        # A cache hit doesn't check out a database connection at all
+        prescription = PrescriptionCacheService.get_or_load(code, load)
+        if not prescription:
+            return jsonify({"status": "error", "message": "Prescription not found"}), 404
+
+        patient_user_id = prescription.pop('patient_user_id')
+        doctor_user_id = prescription.pop('doctor_user_id')
+        if g.role == UserRole.USER.value and patient_user_id != g.user_id:
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+        elif g.role == UserRole.DOCTOR.value and doctor_user_id != g.user_id:
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+        return jsonify({"status": "success", "prescription": prescription}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
 @bp.get('/patient/<int:patient_id>')
+@query_budget(2)
 @role_required(UserRole.ADMIN.value, UserRole.USER.value)
 def get_prescriptions_by_patient(patient_id):
     if not patient_id:
         return jsonify({"status": "error", "message": "No patient ID provided"}), 400
+    compact = request.args.get('format') == 'columns'
+    include_items = request.args.get('include') == 'items'
+    limit, after = None, None
+    if include_items:
+        try:
+            limit, after = parse_items_page(request.args)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient(patient_id)
 
@@ -94,18 +149,30 @@ def get_prescriptions_by_patient(patient_id):
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             prescription_manager = PrescriptionQueryManager(cur)
-            prescriptions = prescription_manager.get_prescriptions_by_patient(patient_id)
-        return jsonify({"status": "success", "prescriptions": prescriptions}), 200
+            if include_items:
+                return prescription_page(prescription_manager.get_prescriptions_with_items_by_patient(patient_id, limit, after), limit)
+            prescriptions = prescription_manager.get_prescriptions_by_patient(patient_id, compact=compact)
+        return jsonify({"status": "success", "prescriptions": serialize_rows(prescriptions)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @bp.get('/doctor/<int:doctor_id>')
+@query_budget(2)
 @role_required(UserRole.ADMIN.value, UserRole.DOCTOR.value)
 def get_prescriptions_by_doctor(doctor_id):
     if not doctor_id:
         return jsonify({"status": "error", "message": "No doctor ID provided"}), 400
+    stream = request.args.get('stream', '').lower() == 'true'
+    compact = request.args.get('format') == 'columns'
+    include_items = request.args.get('include') == 'items'
+    limit, after = None, None
+    if include_items:
+        try:
+            limit, after = parse_items_page(request.args)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             doctor = user_manager.get_doctor(doctor_id)
 
@@ -113,8 +180,12 @@ def get_prescriptions_by_doctor(doctor_id):
                 return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
             prescription_manager = PrescriptionQueryManager(cur)
-            prescriptions = prescription_manager.get_prescriptions_by_doctor(doctor_id)
-        return jsonify({"status": "success", "prescriptions": prescriptions}), 200
+            if include_items:
+                return prescription_page(prescription_manager.get_prescriptions_with_items_by_doctor(doctor_id, limit, after), limit)
+            prescriptions = prescription_manager.get_prescriptions_by_doctor(doctor_id, stream=stream, compact=compact)
+        if stream:
+            return stream_json_list("prescriptions", prescriptions)
+        return jsonify({"status": "success", "prescriptions": serialize_rows(prescriptions)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
@@ -12,7 +12,7 @@ bp = Blueprint('user', __name__)
 @role_required(UserRole.ADMIN.value)
 def get_pending_users():
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             pending_users = user_manager.get_pending_users()
         return jsonify({"status": "success", "pending_users": pending_users}), 200
@@ -25,7 +25,7 @@ def get_patient(user_id):
     if not user_id:
         return jsonify({"status": "error", "message": ErrorMessages.NO_USER_ID.value}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             patient = user_manager.get_patient_by_user_id(user_id)
 
@@ -46,7 +46,7 @@ def get_doctor(user_id):
     if not user_id:
         return jsonify({"status": "error", "message": ErrorMessages.NO_USER_ID.value}), 400
     try:
-        with DbPool.cursor() as cur:
+        with DbPool.cursor(readonly=True) as cur:
             user_manager = UserQueryManager(cur)
             doctor = user_manager.get_doctor_by_user_id(user_id)
 
@@ -1,60 +1,764 @@
 import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
 from contextlib import contextmanager
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, Optional
+import psycopg2
+import redis
+from flask import g, has_request_context
+from psycopg2 import extensions
 from psycopg2 import pool as pg_pool
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
+from redis_connection import RedisClient
+from utils.query_log import QueryLog
+from middleware.request_deadline import statement_timeout_ms
 
 load_dotenv()
 
+# Upper bounds (in milliseconds) of the acquire wait-time histogram buckets.
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class PoolTimeout(pg_pool.PoolError):
+    pass
+
+def current_user_id():
+    if has_request_context():
+        return getattr(g, 'user_id', None)
+    return None
+
+class ReplicaLag:
+    """Read-your-writes guard: after a user commits a write, their reads stay
+    on the primary for DB_REPLICA_LAG_TOLERANCE seconds."""
+    lag_tolerance = float(os.getenv('DB_REPLICA_LAG_TOLERANCE', 5))
+
+    @staticmethod
+    def _key(user_id):
+        return f"db:recent_write:{user_id}"
+
+    @classmethod
+    def mark_write(cls, user_id) -> None:
+        if user_id is None or cls.lag_tolerance <= 0:
+            return
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return
+        try:
+            redis_client.set(cls._key(user_id), 1, px=int(cls.lag_tolerance * 1000))
+        except redis.RedisError as e:
+            print(f"Failed to record recent write: {str(e)}")
+
+    @classmethod
+    def has_recent_write(cls, user_id) -> bool:
+        if user_id is None or cls.lag_tolerance <= 0:
+            return False
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            # Without the shared marker we cannot tell, so stay on the primary
+            return True
+        try:
+            return bool(redis_client.exists(cls._key(user_id)))
+        except redis.RedisError:
+            return True
+
+def pool_settings_from_env():
+    """Size the pool from env: explicit DB_POOL_MAX wins, otherwise split the
+    server-side connection budget evenly across the web workers."""
+    workers = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+    budget = int(os.getenv('DB_MAX_CONNECTIONS', 100))
+    default_max = max(1, min(20, budget // workers))
+
+    maxconn = int(os.getenv('DB_POOL_MAX', default_max))
+    return {
+        "minconn": min(int(os.getenv('DB_POOL_MIN', 1)), maxconn),
+        "maxconn": maxconn,
+        "acquire_timeout": float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 5)),
+        "max_lifetime": float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        "idle_timeout": float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+        "check_interval": float(os.getenv('DB_POOL_CHECK_INTERVAL', 30)),
+    }
+
+class BoundedConnectionPool:
+    """Thread-safe connection pool that blocks up to `acquire_timeout` seconds
+    for a free connection instead of failing as soon as it is exhausted.
+
+    Connections older than `max_lifetime` or idle longer than `idle_timeout`
+    (above `minconn`) are closed, and a connection that sat idle longer than
+    `check_interval` is pinged before it is handed out."""
+
+    def __init__(self, minconn, maxconn, acquire_timeout, max_lifetime=1800, idle_timeout=300, check_interval=30, **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: require 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = set()
+        self._created_at = {}
+        self._last_used = {}
+        self._prepared = {}
+        self._statement_timeouts = {}
+        self._opening = 0
+        self._waiters = 0
+        self._closed = False
+
+        self._acquired = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_checks = 0
+        self._wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._conn_kwargs)
+        now = time.monotonic()
+        self._created_at[conn] = now
+        self._last_used[conn] = now
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(conn, None)
+        self._last_used.pop(conn, None)
+        self._prepared.pop(conn, None)
+        self._statement_timeouts.pop(conn, None)
+        if not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_expired(self, conn, now):
+        return now - self._created_at.get(conn, now) > self.max_lifetime
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prune_idle(self):
+        # Idle connections are handed out LIFO, so the stale ones collect on the left
+        now = time.monotonic()
+        while self._idle and self._size() > self.minconn:
+            oldest = self._idle[0]
+            if now - self._last_used.get(oldest, now) <= self.idle_timeout:
+                break
+            self._discard(self._idle.popleft())
+            self._recycled += 1
+
+    def prepared_on(self, conn):
+        """Names of the statements already PREPAREd on `conn`."""
+        return self._prepared.setdefault(conn, set())
+
+    def set_statement_timeout(self, conn, timeout_ms):
+        """Set the session statement_timeout of an idle (not in-transaction)
+        connection, skipping the round trip when it already has that value."""
+        if self._statement_timeouts.get(conn, 0) == timeout_ms:
+            return
+        autocommit = conn.autocommit
+        # Outside autocommit the SET would be undone by a later rollback
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT set_config('statement_timeout', %s, false)", (str(timeout_ms),))
+        finally:
+            conn.autocommit = autocommit
+        self._statement_timeouts[conn] = timeout_ms
+
+    def _record_wait(self, waited_ms):
+        bucket = len(WAIT_BUCKETS_MS)
+        for index, upper_bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= upper_bound:
+                bucket = index
+                break
+        self._wait_histogram[bucket] += 1
+        self._acquired += 1
+
+    def _open_reserved(self):
+        """Open a connection for a slot already counted in `_opening`."""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._in_use.add(conn)
+        return conn
+
+    def _replace(self, conn):
+        with self._cond:
+            self._in_use.discard(conn)
+            self._discard(conn)
+            self._recycled += 1
+            self._opening += 1
+        return self._open_reserved()
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        conn = None
+
+        with self._cond:
+            self._prune_idle()
+            while True:
+                if self._closed:
+                    raise pg_pool.PoolError("connection pool is closed")
+                if self._idle:
+                    # LIFO keeps the most recently used connections warm
+                    conn = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+                if self._size() < self.maxconn:
+                    self._opening += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection")
+
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+        if conn is None:
+            conn = self._open_reserved()
+        else:
+            now = time.monotonic()
+            if self._is_expired(conn, now) or conn.closed:
+                conn = self._replace(conn)
+            elif now - self._last_used.get(conn, now) > self.check_interval and not self._is_alive(conn):
+                with self._cond:
+                    self._failed_checks += 1
+                conn = self._replace(conn)
+
+        with self._cond:
+            self._record_wait((time.monotonic() - started) * 1000)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            now = time.monotonic()
+            if close or conn.closed or self._closed or self._is_expired(conn, now):
+                self._discard(conn)
+                self._recycled += 1
+            else:
+                self._last_used[conn] = now
+                self._idle.append(conn)
+            self._prune_idle()
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            for conn in self._in_use:
+                self._discard(conn)
+            self._in_use.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            histogram = {f"le_{upper_bound}ms": count for upper_bound, count in zip(WAIT_BUCKETS_MS, self._wait_histogram)}
+            histogram["le_inf"] = self._wait_histogram[-1]
+            return {
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "size": self._size(),
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "failed_checks": self._failed_checks,
+                "wait_ms_histogram": histogram,
+            }
+
+# Rows fetched per round trip by streaming (server-side) cursors
+STREAM_ITERSIZE = int(os.getenv('DB_STREAM_ITERSIZE', 500))
+
+# Only plain reads are replayed after a dropped connection; anything else
+# may already have taken effect on the server.
+READ_STATEMENT = re.compile(r"^(SELECT|SHOW|WITH)\b", re.IGNORECASE)
+# Anything in a read (e.g. in a WITH body) that writes, locks rows or calls a
+# function with side effects makes the statement a write
+WRITE_CLAUSE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|INTO|FOR\s+(NO\s+KEY\s+)?UPDATE|FOR\s+(KEY\s+)?SHARE"
+    r"|nextval|setval|set_config|pg_notify|pg_(try_)?advisory_\w+)\b",
+    re.IGNORECASE
+)
+SQL_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+SQL_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+
+@lru_cache(maxsize=1024)
+def is_read_only(sql):
+    """Whether a statement only reads: a SELECT, SHOW or WITH query with no
+    data-modifying statement, row lock or side-effecting function in it.
+    Literals, quoted identifiers and comments are ignored."""
+    sql = SQL_QUOTED.sub("''", SQL_COMMENT.sub(" ", sql)).strip()
+    return bool(READ_STATEMENT.match(sql)) and not WRITE_CLAUSE.search(sql)
+
+class CompactRows:
+    """Rows as plain tuples plus one shared column header, instead of a dict
+    per row repeating every column name."""
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_dict(self):
+        return {"columns": self.columns, "rows": self.rows}
+
+class PreparedStatement:
+    """A hot read statement that is PREPAREd once per connection and then run
+    with EXECUTE, so PostgreSQL parses and plans it only once per session.
+
+    Set DB_PREPARED_STATEMENTS=false to send the plain SQL instead."""
+    enabled = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() in ('1', 'true', 'yes')
+    _registry: Dict[str, "PreparedStatement"] = {}
+
+    def __init__(self, name, sql):
+        if not is_read_only(sql):
+            raise ValueError(f"Only read statements can be prepared: {name}")
+        if name in PreparedStatement._registry:
+            raise ValueError(f"Prepared statement {name} is already registered")
+
+        self.name = name
+        self.sql = sql
+        param_count = sql.count('%s')
+        positions = iter(range(1, param_count + 1))
+        self.prepare_sql = f"PREPARE {name} AS " + re.sub(r'%s', lambda _: f"${next(positions)}", sql)
+        self.execute_sql = f"EXECUTE {name}" + (f" ({', '.join(['%s'] * param_count)})" if param_count else "")
+        PreparedStatement._registry[name] = self
+
+    @classmethod
+    def all(cls):
+        return list(cls._registry.values())
+
+class PooledCursor:
+    """Cursor proxy that re-runs a read-only statement once on a fresh pooled
+    connection when the current connection turns out to be dead, as long as
+    nothing has been written in the transaction yet.
+
+    A `readonly` cursor rejects anything but SELECT/SHOW. `wrote` carries
+    over writes made earlier in the same transaction by other cursors."""
+
+    def __init__(self, pool, conn, cursor_factory=RealDictCursor, readonly=False, wrote=False, statement_timeout=0):
+        self._pool = pool
+        self._cursor_factory = cursor_factory
+        self._autocommit = conn.autocommit
+        self._statement_timeout = statement_timeout
+        self.readonly = readonly
+        self.connection = conn
+        self._cur = conn.cursor(cursor_factory=cursor_factory)
+        self._wrote = wrote
+        self._retried = False
+
+    @property
+    def wrote(self):
+        return self._wrote
+
+    def _can_retry(self, query):
+        return (
+            not self._retried
+            and not self._wrote
+            and bool(self.connection.closed)
+            and is_read_only(query)
+        )
+
+    def _reconnect(self):
+        self._retried = True
+        dead_conn = self.connection
+        self._pool.putconn(dead_conn, close=True)
+        self.connection = self._pool.getconn()
+        self._pool.set_statement_timeout(self.connection, self._statement_timeout)
+        self.connection.autocommit = self._autocommit
+        self._cur = self.connection.cursor(cursor_factory=self._cursor_factory)
+
+    def execute(self, query, vars=None):
+        if not is_read_only(query):
+            if self.readonly:
+                raise psycopg2.ProgrammingError("Cannot execute a write statement on a read-only cursor")
+            self._wrote = True
+        with QueryLog.timed(query, vars, self.explain) as record:
+            try:
+                result = self._cur.execute(query, vars)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                if not self._can_retry(query):
+                    raise
+                self._reconnect()
+                result = self._cur.execute(query, vars)
+            record.rows = self._cur.rowcount
+            return result
+
+    def execute_prepared(self, statement: PreparedStatement, vars=()):
+        if not PreparedStatement.enabled:
+            return self.execute(statement.sql, vars)
+        with QueryLog.timed(statement.sql, vars, self.explain) as record:
+            try:
+                result = self._execute_prepared(statement, vars)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                if not self._can_retry(statement.sql):
+                    raise
+                self._reconnect()
+                result = self._execute_prepared(statement, vars)
+            record.rows = self._cur.rowcount
+            return result
+
+    def _execute_prepared(self, statement, vars):
+        prepared = self._pool.prepared_on(self.connection)
+        if statement.name not in prepared:
+            self._cur.execute(statement.prepare_sql)
+            prepared.add(statement.name)
+        return self._cur.execute(statement.execute_sql, vars)
+
+    def explain(self, query, vars=None):
+        """Plan of a statement (EXPLAIN without ANALYZE, so it is not run
+        again), as text lines. Not recorded in the request's query log."""
+        with self.connection.cursor() as plan_cursor:
+            plan_cursor.execute("EXPLAIN " + query, vars)
+            return [row[0] for row in plan_cursor.fetchall()]
+
+    def fetch_compact(self, query, vars=None) -> CompactRows:
+        """Run a read statement on a plain tuple cursor of the same connection."""
+        if not is_read_only(query):
+            raise psycopg2.ProgrammingError("Only read statements can be fetched in compact form")
+        with self.connection.cursor() as tuple_cursor, QueryLog.timed(query, vars, self.explain) as record:
+            tuple_cursor.execute(query, vars)
+            record.rows = tuple_cursor.rowcount
+            columns = [column.name for column in tuple_cursor.description]
+            return CompactRows(columns, tuple_cursor.fetchall())
+
+    def stream(self, query, vars=None, itersize: Optional[int] = None):
+        """Return a generator over the rows of a read statement, fetched from a
+        named server-side cursor `itersize` rows per round trip, so the full
+        result is never held in memory.
+
+        The generator checks out its own connection on first iteration and
+        returns it when exhausted or closed, so it can be consumed after the
+        request's cursor and connection are gone (e.g. by a streamed response)."""
+        if not is_read_only(query):
+            raise psycopg2.ProgrammingError("Only read statements can be streamed")
+        return self._stream(query, vars, itersize or STREAM_ITERSIZE, statement_timeout_ms())
+
+    def _stream(self, query, vars, itersize, statement_timeout):
+        conn = self._pool.getconn()
+        named_cursor = None
+        try:
+            self._pool.set_statement_timeout(conn, statement_timeout)
+            # Server-side cursors only live inside a transaction, so this
+            # connection keeps the pool default (autocommit off)
+            named_cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=self._cursor_factory)
+            named_cursor.itersize = itersize
+            with QueryLog.timed(query, vars):
+                named_cursor.execute(query, vars)
+            for row in named_cursor:
+                yield row
+        finally:
+            if named_cursor is not None and not conn.closed:
+                try:
+                    named_cursor.close()
+                except psycopg2.Error:
+                    pass
+            self._pool.putconn(conn)
+
+    def executemany(self, query, vars_list):
+        if self.readonly:
+            raise psycopg2.ProgrammingError("Cannot execute a write statement on a read-only cursor")
+        self._wrote = True
+        with QueryLog.timed(query) as record:
+            result = self._cur.executemany(query, vars_list)
+            record.rows = self._cur.rowcount
+            return result
+
+    def close(self):
+        if not self._cur.closed:
+            self._cur.close()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+class RequestConnection:
+    def __init__(self, pool, conn, statement_timeout):
+        self.pool = pool
+        self.conn = conn
+        self.statement_timeout = statement_timeout
+        self.wrote = False
+        self.savepoints = 0
+
+    def run(self, sql):
+        # Transaction control of the request itself, kept out of the query log
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+
+def connection_settings_from_env(prefix="DB"):
+    """Connection kwargs for the server described by `<prefix>_*` variables;
+    replica settings fall back to the primary ones when not given."""
+    def setting(name, default=None):
+        return os.getenv(f"{prefix}_{name}") or os.getenv(f"DB_{name}", default)
+
+    return {
+        "host": setting("HOST"),
+        "port": int(setting("PORT", 5432)),
+        "database": setting("NAME"),
+        "user": setting("USERNAME"),
+        "password": setting("PASSWORD"),
+    }
+
 class DbPool:
-    _pool: Optional[pg_pool.SimpleConnectionPool] = None
+    _pool: Optional[BoundedConnectionPool] = None
+    _replica_pool: Optional[BoundedConnectionPool] = None
+    _init_lock = threading.Lock()
 
     @classmethod
     def init(cls) -> None:
         if cls._pool is None:
-            cls._pool = pg_pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=10,
-                host=os.environ["DB_HOST"],
-                database=os.environ["DB_NAME"],
-                user=os.environ["DB_USERNAME"],
-                password=os.environ["DB_PASSWORD"],
-            )
+            with cls._init_lock:
+                if cls._pool is None:
+                    if os.getenv("DB_REPLICA_HOST"):
+                        cls._replica_pool = BoundedConnectionPool(
+                            **pool_settings_from_env(),
+                            **connection_settings_from_env("DB_REPLICA"),
+                        )
+                    cls._pool = BoundedConnectionPool(
+                        **pool_settings_from_env(),
+                        **connection_settings_from_env(),
+                    )
 
     @classmethod
-    def getconn(cls):
+    def getconn(cls, timeout: Optional[float] = None):
         cls.init()
         assert cls._pool is not None
-        return cls._pool.getconn()
+        return cls._pool.getconn(timeout)
 
     @classmethod
-    def putconn(cls, conn):
+    def putconn(cls, conn, close: bool = False):
         if cls._pool and conn:
-            cls._pool.putconn(conn)
+            cls._pool.putconn(conn, close=close)
+
+    @classmethod
+    def _route(cls, readonly: bool, replica: Optional[bool]) -> BoundedConnectionPool:
+        """Reads go to the replica unless the caller pins them, or the current
+        user wrote recently enough that the replica may still lag behind."""
+        assert cls._pool is not None
+        if not readonly or cls._replica_pool is None:
+            return cls._pool
+        if replica is None:
+            replica = not (cls._request_wrote() or ReplicaLag.has_recent_write(current_user_id()))
+        return cls._replica_pool if replica else cls._pool
 
     @classmethod
     @contextmanager
-    def cursor(cls, commit: bool = True):
-        conn = None
+    def cursor(cls, commit: bool = True, readonly: bool = False, replica: Optional[bool] = None):
+        """Readonly cursors run in autocommit, so plain reads skip the
+        BEGIN/COMMIT round trips. Inside a Flask request the block shares the
+        request's connection and transaction (see `_request_cursor`)."""
+        cls.init()
+        pool = cls._route(readonly, replica)
+        if has_request_context():
+            with cls._request_cursor(pool, readonly) as cur:
+                yield cur
+            return
+
+        conn = pool.getconn()
         cur = None
         try:
-            conn = cls.getconn()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+            pool.set_statement_timeout(conn, 0)
+            conn.autocommit = readonly
+            cur = PooledCursor(pool, conn, readonly=readonly)
             yield cur
-            if commit:
-                conn.commit() 
+            if commit and not readonly:
+                cur.connection.commit()
         except Exception:
-            if conn:
+            conn = cur.connection if cur else conn
+            if not conn.closed:
                 conn.rollback()
             raise
         finally:
             if cur:
                 cur.close()
-            if conn:
-                cls.putconn(conn)
+                conn = cur.connection
+            if readonly and not conn.closed:
+                conn.autocommit = False
+            pool.putconn(conn)
+
+    @classmethod
+    @contextmanager
+    def _request_cursor(cls, pool, readonly: bool):
+        """The request's first cursor block on a pool checks out a connection,
+        kept until teardown. It starts in autocommit for reads and switches to
+        a transaction on the first write block; that transaction is committed
+        once by `commit_request` after the view returns.
+
+        A block that raises only undoes its own work: once the transaction
+        holds writes, each block runs under a savepoint, and the `on_commit`
+        callbacks the block queued are dropped with it."""
+        if '_db_connections' not in g:
+            g._db_connections = {}
+        bound = g._db_connections.get(pool)
+        if bound is None:
+            # Neither waiting for a connection nor any statement may outlive
+            # the request's deadline
+            timeout_ms = statement_timeout_ms()
+            conn = pool.getconn(min(pool.acquire_timeout, timeout_ms / 1000) if timeout_ms else None)
+            bound = g._db_connections[pool] = RequestConnection(pool, conn, timeout_ms)
+            pool.set_statement_timeout(conn, timeout_ms)
+            conn.autocommit = readonly
+        elif not readonly and bound.conn.autocommit:
+            bound.conn.autocommit = False
+
+        callbacks = g.setdefault('_on_commit', [])
+        queued = len(callbacks)
+        savepoint = None
+        if bound.wrote:
+            bound.savepoints += 1
+            savepoint = f"request_block_{bound.savepoints}"
+            bound.run(f"SAVEPOINT {savepoint}")
+
+        cur = PooledCursor(pool, bound.conn, readonly=readonly, wrote=bound.wrote, statement_timeout=bound.statement_timeout)
+        try:
+            yield cur
+            bound.wrote = cur.wrote
+            if savepoint:
+                bound.run(f"RELEASE SAVEPOINT {savepoint}")
+        except Exception:
+            del callbacks[queued:]
+            if not cls._rollback_block(bound, cur.connection, savepoint):
+                # Earlier blocks' writes are gone too, and so are their callbacks
+                bound.wrote = False
+                callbacks.clear()
+            raise
+        finally:
+            cur.close()
+            bound.conn = cur.connection
+
+    @classmethod
+    def _rollback_block(cls, bound, conn, savepoint) -> bool:
+        """Undo a failed block; True when the writes of earlier blocks survive."""
+        if conn.closed:
+            return False
+        if savepoint and conn is bound.conn:
+            try:
+                bound.run(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                return True
+            except psycopg2.Error:
+                pass
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+        return False
+
+    @classmethod
+    def _request_wrote(cls) -> bool:
+        # Uncommitted writes of this request are only visible on the primary
+        if not has_request_context():
+            return False
+        return any(bound.wrote for bound in g.get('_db_connections', {}).values())
+
+    @classmethod
+    def commit_request(cls, success: bool = True) -> None:
+        """Commit (or roll back) the request's writes before the response is sent."""
+        for bound in g.get('_db_connections', {}).values():
+            if not bound.wrote or bound.conn.closed:
+                continue
+            if success:
+                bound.conn.commit()
+                ReplicaLag.mark_write(current_user_id())
+            else:
+                bound.conn.rollback()
+            bound.wrote = False
+
+        for callback in g.pop('_on_commit', []):
+            if not success:
+                break
+            try:
+                callback()
+            except Exception as e:
+                print(f"on_commit callback failed: {str(e)}")
+
+    @classmethod
+    def on_commit(cls, callback) -> None:
+        """Run `callback` after the request's transaction commits, e.g. to
+        invalidate a cache so it cannot be refilled with the pre-commit state.
+        Dropped if the request fails; outside a request it runs right away."""
+        if not has_request_context():
+            callback()
+            return
+        g.setdefault('_on_commit', []).append(callback)
+
+    @classmethod
+    def release_request(cls) -> None:
+        for bound in g.pop('_db_connections', {}).values():
+            conn = bound.conn
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                    conn.autocommit = False
+                except psycopg2.Error:
+                    bound.pool.putconn(conn, close=True)
+                    continue
+            bound.pool.putconn(conn)
+
+    @classmethod
+    def stats(cls):
+        cls.init()
+        assert cls._pool is not None
+        return {
+            "primary": cls._pool.stats(),
+            "replica": cls._replica_pool.stats() if cls._replica_pool else None,
+        }
 
     @classmethod
     def closeall(cls):
         if cls._pool:
-            cls._pool.closeall()
\ No newline at end of file
+            cls._pool.closeall()
+        if cls._replica_pool:
+            cls._replica_pool.closeall()
@@ -1,7 +1,9 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 from db_connection import DbPool
+from middleware.query_budget import report_query_stats
+from middleware.request_deadline import start_request_deadline
 from controllers.user import bp as user_bp
 from controllers.appointment import bp as appointment_bp
 from controllers.availability import bp as availability_bp
@@ -10,6 +12,8 @@ from controllers.patient import bp as patient_bp
 from controllers.doctor import bp as doctor_bp
 from controllers.auth import bp as auth_bp
 from controllers.notification import bp as notification_bp
+from controllers.health import bp as health_bp
+from migrate import migrate_on_startup
 import atexit
 
 load_dotenv()
@@ -34,10 +38,33 @@ app.register_blueprint(patient_bp, url_prefix='/patient')
 app.register_blueprint(doctor_bp, url_prefix='/doctor')
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(notification_bp, url_prefix='/notification')
+app.register_blueprint(health_bp, url_prefix='/health')
+
+@app.before_request
+def set_request_deadline():
+    start_request_deadline()
+
+@app.after_request
+def commit_db_transaction(response):
+    try:
+        DbPool.commit_request(success=response.status_code < 400)
+    except Exception as e:
+        response = jsonify({"status": "error", "message": str(e)})
+        response.status_code = 500
+    return response
+
+@app.after_request
+def report_sql(response):
+    return report_query_stats(response)
+
+@app.teardown_request
+def release_db_connection(exc):
+    DbPool.release_request()
 
 @atexit.register
 def cleanup():
     DbPool.closeall()
 
 if __name__ == '__main__':
+    migrate_on_startup()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,44 @@
+import os
+from flask import current_app, request
+from utils.query_log import QueryLog
+
+SQL_STATS_HEADERS = os.getenv('SQL_STATS_HEADERS', 'false').lower() in ('1', 'true', 'yes')
+QUERY_BUDGET_STRICT = os.getenv('SQL_QUERY_BUDGET_STRICT', 'false').lower() in ('1', 'true', 'yes')
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def query_budget(max_queries):
+    """Declare how many SQL statements a route may run per request. Place it
+    right below the route decorator so the registered view carries it."""
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+def report_query_stats(response):
+    """Summarize the request's SQL: optional X-Query-* headers, a log line for
+    duplicated/repeated statements, and the route's query budget check, which
+    raises in testing or with SQL_QUERY_BUDGET_STRICT=true."""
+    summary = QueryLog.summary()
+    route = f"{request.method} {request.path}"
+
+    if SQL_STATS_HEADERS or current_app.debug:
+        response.headers['X-Query-Count'] = str(summary['count'])
+        response.headers['X-Query-Time-Ms'] = str(summary['total_ms'])
+        response.headers['X-Query-Duplicates'] = str(len(summary['duplicates']))
+
+    for duplicate in summary['duplicates']:
+        print(f"⚠ {route}: identical statement ran {duplicate['times']}x: {duplicate['sql']}")
+    for repeated in summary['repeated']:
+        print(f"⚠ {route}: possible N+1, statement ran {repeated['times']}x: {repeated['sql']}")
+
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None and summary['count'] > budget:
+        message = f"{route} ran {summary['count']} SQL statements, budget is {budget}"
+        if current_app.testing or QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        print(f"⚠ {message}")
+
+    return response
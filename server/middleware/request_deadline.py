@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Optional
+from flask import current_app, g, has_request_context, request
+
+# Default time budget of a request, in seconds; routes can override it with
+# @request_timeout
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 10))
+# Per-endpoint overrides without a redeploy, e.g.
+# REQUEST_TIMEOUT_OVERRIDES=doctor.get_doctor=2,notification.get_notifications=15
+REQUEST_TIMEOUT_OVERRIDES = {
+    endpoint.strip(): float(seconds)
+    for endpoint, seconds in (
+        item.rsplit('=', 1) for item in os.getenv('REQUEST_TIMEOUT_OVERRIDES', '').split(',') if item.strip()
+    )
+}
+
+class DeadlineExceeded(Exception):
+    pass
+
+def request_timeout(seconds):
+    """Declare the time budget of a route. Place it right below the route
+    decorator so the registered view carries it."""
+    def decorator(f):
+        f.request_timeout = seconds
+        return f
+    return decorator
+
+def start_request_deadline():
+    budget = REQUEST_TIMEOUT_OVERRIDES.get(request.endpoint)
+    if budget is None:
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        budget = getattr(view, 'request_timeout', REQUEST_TIMEOUT)
+    g.request_deadline = time.monotonic() + budget
+
+def remaining_request_time() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None outside a request."""
+    if not has_request_context() or 'request_deadline' not in g:
+        return None
+    remaining = g.request_deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded for {request.method} {request.path}")
+    return remaining
+
+def statement_timeout_ms() -> int:
+    """statement_timeout for the current request's queries; 0 (no limit) outside a request."""
+    remaining = remaining_request_time()
+    if remaining is None:
+        return 0
+    return max(1, int(remaining * 1000))
@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import psycopg2
+from dotenv import load_dotenv
+from db_connection import connection_settings_from_env
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+# Any fixed key works, it only has to be the same for every app instance
+MIGRATION_LOCK_KEY = 4815162342
+
+def available_migrations():
+    """(version, name, path) of every migrations/NNNN_name.sql, in version order."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+def split_statements(sql):
+    sql = "\n".join(line for line in sql.splitlines() if not line.strip().startswith('--'))
+    return [statement.strip() for statement in sql.split(';') if statement.strip()]
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version int PRIMARY KEY,
+            name varchar NOT NULL,
+            applied_at timestamp NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+def pending_migrations(cur):
+    applied = applied_versions(cur)
+    return [migration for migration in available_migrations() if migration[0] not in applied]
+
+def drop_invalid_index(cur, index_name):
+    """A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind that
+    IF NOT EXISTS would then skip, so drop it before retrying."""
+    cur.execute("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (index_name,))
+    if cur.fetchone():
+        print(f"  dropping invalid index {index_name} left by an earlier attempt")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+def apply_migration(conn, version, name, path):
+    """Migrations that build indexes CONCURRENTLY cannot run inside a
+    transaction, so they run statement by statement (each must be safe to
+    re-run); all others run in a single transaction."""
+    with open(path) as f:
+        sql = f.read()
+
+    with conn.cursor() as cur:
+        if CONCURRENT_INDEX.search(sql):
+            for statement in split_statements(sql):
+                index = CONCURRENT_INDEX.match(statement)
+                if index:
+                    drop_invalid_index(cur, index.group(1))
+                cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        else:
+            cur.execute("BEGIN")
+            try:
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+def migrate(apply=True):
+    """Bring the schema up to date (or, with apply=False, only report what is
+    pending). A session advisory lock keeps concurrently starting app
+    instances from running the same migration twice. Returns the versions
+    that are still pending."""
+    # A dedicated connection: migrations may run far longer than any request
+    # and must not inherit a pooled connection's statement_timeout
+    conn = psycopg2.connect(**connection_settings_from_env())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                pending = pending_migrations(cur)
+                if not apply:
+                    return [version for version, _, _ in pending]
+                for version, name, path in pending:
+                    print(f"Applying migration {version:04d}_{name}")
+                    apply_migration(conn, version, name, path)
+                return []
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    finally:
+        conn.close()
+
+def migrate_on_startup():
+    """DB_MIGRATIONS_ON_STARTUP=apply (default) applies pending migrations,
+    `check` only warns about them, `off` skips the check."""
+    mode = os.getenv('DB_MIGRATIONS_ON_STARTUP', 'apply').lower()
+    if mode == 'off':
+        return
+    try:
+        pending = migrate(apply=mode == 'apply')
+    except Exception as e:
+        print(f"✗ Schema migration failed: {str(e)}")
+        raise
+    if pending:
+        print(f"⚠ Schema is behind, pending migrations: {', '.join(f'{version:04d}' for version in pending)}")
+    else:
+        print("✓ Schema is up to date")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("apply", "check"):
+        print("Usage: python migrate.py [apply|check]")
+        sys.exit(1)
+
+    try:
+        pending = migrate(apply=len(sys.argv) < 2 or sys.argv[1] == "apply")
+    except Exception as e:
+        print(f"✗ Error running migrations: {str(e)}")
+        sys.exit(1)
+    if pending:
+        print(f"Pending migrations: {', '.join(f'{version:04d}' for version in pending)}")
+        sys.exit(1)
+    print("✓ Schema is up to date")
@@ -0,0 +1,16 @@
+-- Indexes behind the listing queries in queries/; without them every
+-- listing is a sequential scan.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_patient_date ON appointments (patient_id, appointment_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_doctor_date ON appointments (doctor_id, appointment_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_availability ON appointments (availability_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_doctor_availability_doctor_start ON doctor_availability (doctor_id, start_time);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_prescriptions_patient_issued ON prescriptions (patient_id, issued_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_prescription_items_prescription ON prescription_items (prescription_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_created ON notifications (user_id, created_at);
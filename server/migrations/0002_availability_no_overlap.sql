@@ -0,0 +1,10 @@
+-- Reject overlapping availability of the same doctor in the database, so the
+-- check is an index probe and holds under concurrent inserts. Slots are
+-- half-open like the OVERLAPS check they replace: back-to-back slots are fine.
+-- Fails if the table already holds overlapping slots; remove those first.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE doctor_availability
+  ADD CONSTRAINT doctor_availability_no_overlap
+  EXCLUDE USING gist (doctor_id WITH =, tsrange(start_time, end_time, '[)') WITH &&);
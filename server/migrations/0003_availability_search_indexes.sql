@@ -0,0 +1,5 @@
+-- Availability search by specialization over a start_time range.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_doctor_availability_available_start ON doctor_availability (is_available, start_time);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_doctors_specialization ON doctors (specialization);
@@ -0,0 +1,5 @@
+-- At most one scheduled appointment per availability slot, backing the atomic
+-- claim in create_appointment. Fails if a slot is already double-booked;
+-- cancel the duplicates and re-run (the invalid index left behind is dropped).
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_appointments_active_availability ON appointments (availability_id) WHERE status = 'scheduled';
@@ -0,0 +1,11 @@
+-- Allocate prescription codes from a sequence instead of scanning for
+-- MIN(code) on every insert. Codes start at CODE_MINIMAL_VALUE (1000, see
+-- queries/prescription.py) or continue after the highest existing code.
+-- CACHE hands each connection a block of 20 codes, so concurrent inserts
+-- don't contend on the sequence; codes stay unique but may have gaps.
+
+CREATE SEQUENCE IF NOT EXISTS prescription_code_seq AS int MINVALUE 1000 START WITH 1000 CACHE 20 OWNED BY prescriptions.code;
+
+SELECT setval('prescription_code_seq', GREATEST(COALESCE((SELECT MAX(code) FROM prescriptions), 0) + 1, 1000), false);
+
+ALTER TABLE prescriptions ALTER COLUMN code SET DEFAULT nextval('prescription_code_seq');
@@ -0,0 +1,3 @@
+-- Doctor prescription listings, newest first.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_prescriptions_doctor_issued ON prescriptions (doctor_id, issued_at);
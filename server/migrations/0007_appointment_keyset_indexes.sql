@@ -0,0 +1,10 @@
+-- Keyset pagination of appointment listings on (appointment_date, id); these
+-- supersede the two-column indexes from 0001.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_patient_date_id ON appointments (patient_id, appointment_date, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_doctor_date_id ON appointments (doctor_id, appointment_date, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_appointments_patient_date;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_appointments_doctor_date;
@@ -0,0 +1,3 @@
+-- Unread inbox pages and unread counts without touching read notifications.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread ON notifications (user_id, created_at) WHERE is_read = FALSE;
@@ -0,0 +1,16 @@
+-- Notification events written by requests in their own transaction and
+-- turned into notifications by notification_worker.py. Delivered events are
+-- deleted; an event that keeps failing is kept with failed_at set.
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    event_type varchar NOT NULL,
+    payload jsonb NOT NULL,
+    created_at timestamp NOT NULL,
+    available_at timestamp NOT NULL DEFAULT LOCALTIMESTAMP,
+    attempts int NOT NULL DEFAULT 0,
+    last_error text,
+    failed_at timestamp
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending ON notification_outbox (available_at, id) WHERE failed_at IS NULL;
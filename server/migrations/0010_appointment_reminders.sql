@@ -0,0 +1,9 @@
+-- One row per reminder sent, so each appointment gets each reminder at most
+-- once, whatever the number of scheduler restarts or replicas.
+
+CREATE TABLE IF NOT EXISTS appointment_reminders (
+    appointment_id int NOT NULL REFERENCES appointments (id) ON DELETE CASCADE,
+    reminder_window varchar NOT NULL,
+    created_at timestamp NOT NULL DEFAULT LOCALTIMESTAMP,
+    PRIMARY KEY (appointment_id, reminder_window)
+);
@@ -0,0 +1,3 @@
+-- Range scan of upcoming scheduled appointments for reminder_scheduler.py.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_scheduled_date ON appointments (appointment_date) WHERE status = 'scheduled';
@@ -0,0 +1,140 @@
+"""Delivers notification outbox events off the request path: renders each
+event, inserts the notifications in batches and publishes them to the open
+notification streams. Several workers can run side by side; each claims its
+own batch with FOR UPDATE SKIP LOCKED.
+
+Usage (from the server directory):
+    python notification_worker.py
+"""
+import os
+import signal
+import threading
+import time
+from collections import Counter
+import psycopg2
+from dotenv import load_dotenv
+from db_connection import DbPool
+from queries.notification import NotificationQueryManager, NotificationOutboxQueryManager
+from services.notification_service import NotificationService
+from services.unread_counter_service import UnreadCounterService
+
+load_dotenv()
+
+BATCH_SIZE = int(os.getenv('NOTIFICATION_WORKER_BATCH_SIZE', 200))
+POLL_INTERVAL = float(os.getenv('NOTIFICATION_WORKER_POLL_INTERVAL', 1))
+MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_WORKER_MAX_ATTEMPTS', 5))
+RETRY_DELAY = float(os.getenv('NOTIFICATION_WORKER_RETRY_DELAY', 5))
+# A backlog above this many pending events is logged as a warning
+BACKLOG_WARNING = int(os.getenv('NOTIFICATION_WORKER_BACKLOG_WARNING', 10000))
+# Seconds between backlog checks; counting the outbox is not free
+BACKLOG_CHECK_INTERVAL = 60
+# Upper bound of the pause after consecutive failed batches
+MAX_ERROR_BACKOFF = 60
+
+def reschedule(outbox, event, error):
+    """Retry the event later with exponential backoff, or give up on it after
+    MAX_ATTEMPTS."""
+    if event['attempts'] + 1 >= MAX_ATTEMPTS:
+        print(f"✗ Notification event {event['id']} failed {MAX_ATTEMPTS} times: {error}")
+        outbox.fail_event(event['id'], str(error))
+    else:
+        outbox.retry_event(event['id'], str(error), RETRY_DELAY * 2 ** event['attempts'])
+
+def insert_each(cur, notification_manager, outbox, rendered):
+    """Fallback after a failed batch insert: insert the notifications one by
+    one, each under a savepoint, so a single bad event (e.g. its user was
+    deleted meanwhile) does not hold back the rest of the batch."""
+    delivered, inserted = [], []
+    for event, notification in rendered:
+        cur.execute("SAVEPOINT notification")
+        try:
+            inserted.extend(notification_manager.insert_notifications([notification]))
+            cur.execute("RELEASE SAVEPOINT notification")
+            delivered.append(event['id'])
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT notification")
+            reschedule(outbox, event, e)
+    return delivered, inserted
+
+def process_batch():
+    """Deliver up to BATCH_SIZE due events in one transaction. Returns the
+    number of events claimed."""
+    with DbPool.cursor() as cur:
+        outbox = NotificationOutboxQueryManager(cur)
+        notification_manager = NotificationQueryManager(cur)
+        events = outbox.claim_batch(BATCH_SIZE)
+        if not events:
+            return 0
+
+        rendered = []
+        for event in events:
+            try:
+                notification = NotificationService.render(event['event_type'], event['payload'])
+            except (KeyError, ValueError) as e:
+                # Rendering is deterministic, a retry would fail the same way
+                print(f"✗ Notification event {event['id']} cannot be rendered: {e!r}")
+                outbox.fail_event(event['id'], repr(e))
+                continue
+            # The notification is dated when its event happened, not when delivered
+            notification['created_at'] = event['created_at']
+            rendered.append((event, notification))
+
+        delivered, inserted = [], []
+        if rendered:
+            cur.execute("SAVEPOINT notification_batch")
+            try:
+                inserted = notification_manager.insert_notifications([notification for _, notification in rendered])
+                cur.execute("RELEASE SAVEPOINT notification_batch")
+                delivered = [event['id'] for event, _ in rendered]
+            except psycopg2.Error:
+                cur.execute("ROLLBACK TO SAVEPOINT notification_batch")
+                delivered, inserted = insert_each(cur, notification_manager, outbox, rendered)
+        if delivered:
+            outbox.delete_events(delivered)
+
+    for user_id, count in Counter(row['user_id'] for row in inserted).items():
+        UnreadCounterService.adjust(user_id, count)
+    NotificationService.publish(inserted)
+    return len(events)
+
+def check_backlog():
+    """Warn when events pile up faster than the workers deliver them, a sign
+    that more workers (or bigger batches) are needed."""
+    with DbPool.cursor(readonly=True) as cur:
+        pending = NotificationOutboxQueryManager(cur).backlog()
+    if pending > BACKLOG_WARNING:
+        print(f"⚠ Notification outbox backlog: {pending} pending events (warning above {BACKLOG_WARNING})")
+    return pending
+
+def run(stop: threading.Event):
+    """Drain the outbox: a full batch is followed right away by the next one,
+    otherwise wait POLL_INTERVAL. Failed batches back off exponentially so a
+    struggling database is not hammered."""
+    print(f"✓ Notification worker started (batch size {BATCH_SIZE})")
+    failures = 0
+    next_backlog_check = 0
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_backlog_check:
+                check_backlog()
+                next_backlog_check = time.monotonic() + BACKLOG_CHECK_INTERVAL
+            claimed = process_batch()
+            failures = 0
+        except Exception as e:
+            failures += 1
+            print(f"✗ Notification batch failed: {str(e)}")
+            stop.wait(min(POLL_INTERVAL * 2 ** failures, MAX_ERROR_BACKOFF))
+            continue
+        if claimed < BATCH_SIZE:
+            stop.wait(POLL_INTERVAL)
+    print("✓ Notification worker stopped")
+
+if __name__ == "__main__":
+    stop = threading.Event()
+    # Finish the current batch, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        run(stop)
+    finally:
+        DbPool.closeall()
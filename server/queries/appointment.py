@@ -1,6 +1,24 @@
-from utils.queries import create_placeholder_data
+from utils.queries import create_placeholder_data, fetch_rows
 from constants import AppointmentTables, AppointmentStatus, UserTables
 import datetime as dt
+from db_connection import DbPool, PreparedStatement
+from psycopg2 import errors
+from services.prescription_cache_service import PrescriptionCacheService
+
+# Explicit column lists: a prepared `SELECT *` fails once the table gains a column
+GET_APPOINTMENT = PreparedStatement(
+    "appointment_get_by_id",
+    f"""SELECT id, patient_id, doctor_id, availability_id, appointment_date, status, created_at
+    FROM {AppointmentTables.APPOINTMENTS.value} WHERE id = %s"""
+)
+GET_AVAILABILITY = PreparedStatement(
+    "availability_get_by_id",
+    f"""SELECT id, doctor_id, start_time, end_time, is_available
+    FROM {AppointmentTables.DOCTOR_AVAILABILITY.value} WHERE id = %s"""
+)
+
+class SlotUnavailableError(ValueError):
+    pass
 
 class AppointmentQueryHelper:
     def __init__(self, cursor):
@@ -38,61 +56,67 @@ class AppointmentQueryHelper:
         return self.cur.fetchone()['id']
     
     def get_appointment(self, appointment_id):
-        self.cur.execute(
-            f"""
-            SELECT * FROM {AppointmentTables.APPOINTMENTS.value}
-            WHERE id = %s
-            """,
-            (appointment_id,)
-        )
+        self.cur.execute_prepared(GET_APPOINTMENT, (appointment_id,))
         return self.cur.fetchone()
     
-    def get_appointments_by_patient(self, patient_id):
-        self.cur.execute(
-            f"""
+    @staticmethod
+    def _page_clause(limit, after):
+        """Keyset condition and LIMIT for listings ordered by
+        (appointment_date, id) DESC. `after` is the (appointment_date, id) of
+        the previous page's last row; one extra row tells whether there is
+        more. Without `limit` the whole listing is returned."""
+        condition, limit_clause, params = "", "", []
+        if after is not None:
+            condition = "AND (appointment_date, id) < (%s, %s)"
+            params.extend(after)
+        if limit is not None:
+            limit_clause = "LIMIT %s"
+            params.append(limit + 1)
+        return condition, limit_clause, params
+    
+    def get_appointments_by_patient(self, patient_id, stream=False, compact=False, limit=None, after=None):
+        condition, limit_clause, page_params = self._page_clause(limit, after)
+        query = f"""
             SELECT * FROM {AppointmentTables.APPOINTMENTS.value}
             WHERE patient_id = %s
-            ORDER BY appointment_date DESC
-            """,
-            (patient_id,)
-        )
-        return self.cur.fetchall()
-    
-    def get_upcoming_appointments_by_patient(self, patient_id):
-        self.cur.execute(
-            f"""
+            {condition}
+            ORDER BY appointment_date DESC, id DESC
+            {limit_clause}
+            """
+        return fetch_rows(self.cur, query, (patient_id, *page_params), stream=stream, compact=compact)
+    
+    def get_upcoming_appointments_by_patient(self, patient_id, stream=False, compact=False):
+        query = f"""
             SELECT * FROM {AppointmentTables.APPOINTMENTS.value}
             WHERE patient_id = %s 
             AND appointment_date > NOW()
             AND status = %s
             ORDER BY appointment_date ASC
-            """,
-            (patient_id, AppointmentStatus.SCHEDULED.value)
-        )
-        return self.cur.fetchall()
-
-    def get_past_appointments_by_patient(self, patient_id):
-        self.cur.execute(
-            f"""
+            """
+        return fetch_rows(self.cur, query, (patient_id, AppointmentStatus.SCHEDULED.value), stream=stream, compact=compact)
+    
+    def get_past_appointments_by_patient(self, patient_id, stream=False, compact=False, limit=None, after=None):
+        condition, limit_clause, page_params = self._page_clause(limit, after)
+        query = f"""
             SELECT * FROM {AppointmentTables.APPOINTMENTS.value}
             WHERE patient_id = %s 
             AND (appointment_date < NOW() OR status IN (%s, %s))
-            ORDER BY appointment_date DESC
-            """,
-            (patient_id, AppointmentStatus.COMPLETED.value, AppointmentStatus.CANCELLED.value)
-        )
-        return self.cur.fetchall()
-    
-    def get_appointments_by_doctor(self, doctor_id):
-        self.cur.execute(
-            f"""
+            {condition}
+            ORDER BY appointment_date DESC, id DESC
+            {limit_clause}
+            """
+        return fetch_rows(self.cur, query, (patient_id, AppointmentStatus.COMPLETED.value, AppointmentStatus.CANCELLED.value, *page_params), stream=stream, compact=compact)
+    
+    def get_appointments_by_doctor(self, doctor_id, stream=False, compact=False, limit=None, after=None):
+        condition, limit_clause, page_params = self._page_clause(limit, after)
+        query = f"""
             SELECT * FROM {AppointmentTables.APPOINTMENTS.value}
             WHERE doctor_id = %s
-            ORDER BY appointment_date DESC
-            """,
-            (doctor_id,)
-        )
-        return self.cur.fetchall()
+            {condition}
+            ORDER BY appointment_date DESC, id DESC
+            {limit_clause}
+            """
+        return fetch_rows(self.cur, query, (doctor_id, *page_params), stream=stream, compact=compact)
     
     def get_appointment_by_availability(self, availability_id):
         self.cur.execute(
@@ -105,51 +129,76 @@ class AppointmentQueryHelper:
         return self.cur.fetchone()
     
     def delete_appointment(self, appointment_id):
+        # The appointment's prescriptions go with it (ON DELETE CASCADE); the
+        # outer SELECT still sees them, so their codes come back in one round trip
         self.cur.execute(
             f"""
-            DELETE FROM {AppointmentTables.APPOINTMENTS.value} WHERE id = %s
-            RETURNING id
+            WITH deleted AS (
+                DELETE FROM {AppointmentTables.APPOINTMENTS.value} WHERE id = %s
+                RETURNING id
+            )
+            SELECT d.id, ARRAY(
+                SELECT p.code FROM {AppointmentTables.PRESCRIPTIONS.value} p WHERE p.appointment_id = d.id
+            ) AS prescription_codes
+            FROM deleted d
             """,
             (appointment_id,)
         )
-        return self.cur.fetchone()['id']
+        deleted = self.cur.fetchone()
+        codes = deleted['prescription_codes']
+        if codes:
+            DbPool.on_commit(lambda: PrescriptionCacheService.invalidate(*codes))
+        return deleted['id']
     
 class AvailabilityQueryHelper:
     def __init__(self, cursor):
         self.cur = cursor
 
     def insert_doctor_availability(self, **availability_data):
-        start_time, end_time, doctor_id = availability_data.get('start_time'), availability_data.get('end_time'), availability_data.get('doctor_id')
+        start_time, end_time = availability_data.get('start_time'), availability_data.get('end_time')
         
         if (not start_time) or (not end_time):
             raise ValueError("start_time and end_time must be provided")
         if start_time and end_time and start_time >= end_time:
             raise ValueError("start_time must be before end_time")
         
-        self.cur.execute(
-            f"""
-            SELECT 1 FROM {AppointmentTables.DOCTOR_AVAILABILITY.value}
-            WHERE doctor_id = %s AND
-                  ((start_time, end_time) OVERLAPS (%s, %s))
-            """,
-            (doctor_id, start_time, end_time)
-        )
-        if self.cur.fetchone():
-            raise ValueError("The specified time slot overlaps with existing availability")
-        
         allowed_columns = {'doctor_id', 'is_available', 'start_time', 'end_time'}
         columns, placeholders, values = create_placeholder_data(availability_data, allowed_columns)
 
+        # Overlaps are rejected by the doctor_availability_no_overlap exclusion constraint
+        try:
+            self.cur.execute(
+                f"""
+                INSERT INTO {AppointmentTables.DOCTOR_AVAILABILITY.value} ({columns})
+                VALUES ({placeholders})
+                RETURNING id
+                """,
+                tuple(values)
+            )
+        except errors.ExclusionViolation:
+            raise ValueError("The specified time slot overlaps with existing availability")
+        return self.cur.fetchone()['id']
+    
+    def claim_availability(self, availability_id):
+        """Atomically take an open slot: flip is_available and return the row,
+        or None when it is taken or another transaction is claiming it right
+        now. SKIP LOCKED makes concurrent bookers of one slot fail fast
+        instead of queueing on the row lock."""
         self.cur.execute(
             f"""
-            INSERT INTO {AppointmentTables.DOCTOR_AVAILABILITY.value} ({columns})
-            VALUES ({placeholders})
-            RETURNING id
+            UPDATE {AppointmentTables.DOCTOR_AVAILABILITY.value}
+            SET is_available = FALSE
+            WHERE id = (
+                SELECT id FROM {AppointmentTables.DOCTOR_AVAILABILITY.value}
+                WHERE id = %s AND is_available = TRUE
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, doctor_id, start_time, end_time
             """,
-            tuple(values)
+            (availability_id,)
         )
-        return self.cur.fetchone()['id']
-    
+        return self.cur.fetchone()
+
     def update_doctor_availability(self, **availability_data):
         is_available, availability_id = availability_data.get('is_available'), availability_data.get('availability_id')
         if not isinstance(is_available, bool):
@@ -169,18 +218,22 @@ class AvailabilityQueryHelper:
         )
         return self.cur.fetchone()['id']
     
-    def get_doctor_availability(self, doctor_id):
+    def get_doctor_availability(self, doctor_id, exclude_ids=()):
         self.cur.execute(
             f"""
             SELECT * FROM {AppointmentTables.DOCTOR_AVAILABILITY.value}
-            WHERE doctor_id = %s AND is_available = TRUE
+            WHERE doctor_id = %s AND is_available = TRUE AND id <> ALL(%s)
             ORDER BY start_time
             """,
-            (doctor_id,)
+            (doctor_id, list(exclude_ids))
         )
         return self.cur.fetchall()
     
-    def get_availabilities_by_specialization_and_date(self, specialization, date):
+    def get_availabilities_by_specialization_and_range(self, specialization, start, end, limit, exclude_ids=()):
+        """Open slots starting in [start, end), except `exclude_ids` (e.g.
+        held slots), which are filtered before the LIMIT. The half-open range
+        on the bare column (rather than DATE(start_time) = ...) lets
+        PostgreSQL use idx_doctor_availability_available_start."""
         self.cur.execute(
             f"""
             SELECT 
@@ -196,22 +249,19 @@ class AvailabilityQueryHelper:
             FROM {AppointmentTables.DOCTOR_AVAILABILITY.value} da
             JOIN {UserTables.DOCTORS.value} d ON da.doctor_id = d.id
             WHERE d.specialization = %s
-              AND DATE(da.start_time) = %s
               AND da.is_available = TRUE
+              AND da.start_time >= %s
+              AND da.start_time < %s
+              AND da.id <> ALL(%s)
             ORDER BY da.start_time
+            LIMIT %s
             """,
-            (specialization, date)
+            (specialization, start, end, list(exclude_ids), limit)
         )
         return self.cur.fetchall()
     
     def get_availability_by_id(self, availability_id):
-        self.cur.execute(
-            f"""
-            SELECT * FROM {AppointmentTables.DOCTOR_AVAILABILITY.value}
-            WHERE id = %s
-            """,
-            (availability_id,)
-        )
+        self.cur.execute_prepared(GET_AVAILABILITY, (availability_id,))
         return self.cur.fetchone()
     
     def delete_doctor_availability(self, availability_id):
@@ -244,31 +294,30 @@ class AppointmentQueryManager:
         if not self.cur.fetchone():
             raise ValueError(f"Doctor with id {doctor_id} does not exist")
         
-        availability = self.availability.get_availability_by_id(appointment_data.get('availability_id'))
+        availability_id = appointment_data.get('availability_id')
+        availability = self.availability.claim_availability(availability_id)
         if not availability:
-            raise ValueError(f"Availability with id {appointment_data.get('availability_id')} does not exist")
-        
-        if not availability['is_available']:
-            raise ValueError("The selected availability slot is not available")
+            if not self.availability.get_availability_by_id(availability_id):
+                raise ValueError(f"Availability with id {availability_id} does not exist")
+            raise SlotUnavailableError("The selected availability slot is not available")
         
         appointment_data.update({
             "status": AppointmentStatus.SCHEDULED.value,
             "appointment_date": availability['start_time']
         })
         
-        appointment_id = self.appointment.insert_appointment(**appointment_data)
-
-         # Mark the availability slot as unavailable
-        if appointment_id:
-            self.set_availability_unavailable(appointment_data.get('availability_id'))
-
-        return appointment_id
+        try:
+            return self.appointment.insert_appointment(**appointment_data)
+        except errors.UniqueViolation:
+            # uq_appointments_active_availability: the slot was re-opened while
+            # another scheduled appointment still holds it
+            raise SlotUnavailableError("The selected availability slot is not available")
 
     def create_doctor_availability(self, **availability_data):
         return self.availability.insert_doctor_availability(**availability_data)
     
-    def get_doctor_availability(self, doctor_id):
-        return self.availability.get_doctor_availability(doctor_id)
+    def get_doctor_availability(self, doctor_id, exclude_ids=()):
+        return self.availability.get_doctor_availability(doctor_id, exclude_ids)
     
     def get_availability_by_id(self, availability_id):
         return self.availability.get_availability_by_id(availability_id)
@@ -276,23 +325,26 @@ class AppointmentQueryManager:
     def get_appointment(self, appointment_id):
         return self.appointment.get_appointment(appointment_id)
     
-    def get_appointments_by_patient(self, patient_id):
-        return self.appointment.get_appointments_by_patient(patient_id)
+    def get_appointments_by_patient(self, patient_id, stream=False, compact=False, limit=None, after=None):
+        return self.appointment.get_appointments_by_patient(patient_id, stream=stream, compact=compact, limit=limit, after=after)
     
-    def get_upcoming_appointments_by_patient(self, patient_id):
-        return self.appointment.get_upcoming_appointments_by_patient(patient_id)
+    def get_upcoming_appointments_by_patient(self, patient_id, stream=False, compact=False):
+        return self.appointment.get_upcoming_appointments_by_patient(patient_id, stream=stream, compact=compact)
     
-    def get_past_appointments_by_patient(self, patient_id):
-        return self.appointment.get_past_appointments_by_patient(patient_id)
+    def get_past_appointments_by_patient(self, patient_id, stream=False, compact=False, limit=None, after=None):
+        return self.appointment.get_past_appointments_by_patient(patient_id, stream=stream, compact=compact, limit=limit, after=after)
     
-    def get_appointments_by_doctor(self, doctor_id):
-        return self.appointment.get_appointments_by_doctor(doctor_id)
+    def get_appointments_by_doctor(self, doctor_id, stream=False, compact=False, limit=None, after=None):
+        return self.appointment.get_appointments_by_doctor(doctor_id, stream=stream, compact=compact, limit=limit, after=after)
     
     def get_appointment_by_availability(self, availability_id):
         return self.appointment.get_appointment_by_availability(availability_id)
     
-    def get_availabilities_by_specialization_and_date(self, specialization, date):
-        return self.availability.get_availabilities_by_specialization_and_date(specialization, date)
+    def get_availabilities_by_specialization_and_range(self, specialization, from_date, to_date, limit, exclude_ids=()):
+        """Slots on the days from `from_date` to `to_date`, both inclusive."""
+        start = dt.datetime.combine(from_date, dt.time.min)
+        end = dt.datetime.combine(to_date + dt.timedelta(days=1), dt.time.min)
+        return self.availability.get_availabilities_by_specialization_and_range(specialization, start, end, limit, exclude_ids)
     
     def change_appointment_status(self, **appointment_data):
         return self.appointment.update_appointment_status(**appointment_data)
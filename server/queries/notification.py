@@ -1,66 +1,158 @@
-from constants import UserRole, NOTIFICATION_TABLE, specializations
-from utils.queries import create_placeholder_data, get_set_clause_and_values
+from constants import UserRole, NOTIFICATION_TABLE, NOTIFICATION_OUTBOX_TABLE, AppointmentTables, UserTables, AppointmentStatus, specializations
+from utils.queries import create_placeholder_data, create_values_list, get_set_clause_and_values, fetch_rows
+from psycopg2.extras import Json
 import datetime as dt
 from constants import NotificationType
+from db_connection import DbPool, PreparedStatement
+from services.unread_counter_service import UnreadCounterService
+from utils.pagination import desc_keyset_condition
+
+GET_NOTIFICATION = PreparedStatement(
+    "notification_get_by_id",
+    f"SELECT id, user_id, type, title, content, is_read, created_at FROM {NOTIFICATION_TABLE} WHERE id = %s"
+)
+
+NOTIFICATION_COLUMNS = ('user_id', 'type', 'title', 'content', 'created_at')
 
 class NotificationQueryManager:
     def __init__(self, cursor):
         self.cur = cursor
 
-    def insert_notification(self, user_id, type, title, content, is_read=False):
+    def insert_notifications(self, notifications):
+        """Insert unread notifications in one statement and return the rows.
+        The caller adjusts the unread counters once its transaction commits."""
+        placeholders, values = create_values_list(notifications, NOTIFICATION_COLUMNS)
         self.cur.execute(
             f"""
-            INSERT INTO {NOTIFICATION_TABLE} (user_id, type, title, content, is_read, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
+            INSERT INTO {NOTIFICATION_TABLE} ({', '.join(NOTIFICATION_COLUMNS)}, is_read)
+            SELECT notification.*, FALSE FROM (VALUES {placeholders}) AS notification ({', '.join(NOTIFICATION_COLUMNS)})
+            RETURNING id, user_id, type, title, content, is_read, created_at
             """,
-            tuple([user_id, type, title, content, is_read, dt.datetime.now()])
+            values
         )
-        return self.cur.fetchone()['id']
-    
+        return self.cur.fetchall()
+
     def mark_notification_as_read(self, notification_id):
+        # `previous` locks the row and tells whether this call is what made
+        # it read, so the unread counter is decremented exactly once
         self.cur.execute(
             f"""
-            UPDATE {NOTIFICATION_TABLE}
+            UPDATE {NOTIFICATION_TABLE} n
             SET is_read = TRUE
-            WHERE id = %s
-            RETURNING id
+            FROM (SELECT id, is_read FROM {NOTIFICATION_TABLE} WHERE id = %s FOR UPDATE) previous
+            WHERE n.id = previous.id
+            RETURNING n.id, n.user_id, previous.is_read AS was_read
             """,
             (notification_id,)
         )
-        return self.cur.fetchone()['id']
+        notification = self.cur.fetchone()
+        if notification is None:
+            return None
+        if not notification['was_read']:
+            user_id = notification['user_id']
+            DbPool.on_commit(lambda: UnreadCounterService.adjust(user_id, -1))
+        return notification['id']
     
-    def get_notification(self, notification_id):
+    def mark_all_as_read(self, user_id):
         self.cur.execute(
             f"""
-            SELECT * FROM {NOTIFICATION_TABLE}
-            WHERE id = %s
+            UPDATE {NOTIFICATION_TABLE}
+            SET is_read = TRUE
+            WHERE user_id = %s AND is_read = FALSE
+            RETURNING id
             """,
-            (notification_id,)
+            (user_id,)
         )
+        return self._mark_read(user_id)
+
+    def mark_as_read(self, user_id, notification_ids):
+        """Mark the user's notifications among `notification_ids` as read; ids
+        of other users' notifications are ignored."""
+        self.cur.execute(
+            f"""
+            UPDATE {NOTIFICATION_TABLE}
+            SET is_read = TRUE
+            WHERE user_id = %s AND id = ANY(%s) AND is_read = FALSE
+            RETURNING id
+            """,
+            (user_id, list(notification_ids))
+        )
+        return self._mark_read(user_id)
+
+    def _mark_read(self, user_id):
+        # `is_read = FALSE` is rechecked on rows updated concurrently, so each
+        # row is counted by exactly one transaction
+        ids = [row['id'] for row in self.cur.fetchall()]
+        if ids:
+            DbPool.on_commit(lambda: UnreadCounterService.adjust(user_id, -len(ids)))
+        return ids
+
+    def get_notification(self, notification_id):
+        self.cur.execute_prepared(GET_NOTIFICATION, (notification_id,))
         return self.cur.fetchone()
     
-    def get_notifications_by_user(self, user_id):
+    def get_notifications_by_user(self, user_id, stream=False, compact=False, unread=False, limit=None, after=None):
+        """Newest first. With `limit`, one keyset page after `after` = the
+        (created_at, id) of the previous page's last row, plus one extra row
+        telling whether there is more."""
+        conditions, params = ["user_id = %s"], [user_id]
+        if unread:
+            # Matches the partial index idx_notifications_user_unread
+            conditions.append("is_read = FALSE")
+        if after is not None:
+            condition, after_params = desc_keyset_condition("created_at", "id", after)
+            conditions.append(condition)
+            params.extend(after_params)
+        limit_clause = ""
+        if limit is not None:
+            limit_clause = "LIMIT %s"
+            params.append(limit + 1)
+
+        query = f"""
+            SELECT id, title, type, content, is_read, created_at FROM {NOTIFICATION_TABLE}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            {limit_clause}
+            """
+        return fetch_rows(self.cur, query, tuple(params), stream=stream, compact=compact)
+    
+    def get_notifications_after(self, user_id, last_id, limit):
+        """The user's notifications with an id above `last_id`, oldest first,
+        for a notification stream resuming from its Last-Event-ID."""
         self.cur.execute(
             f"""
-            SELECT title, type, content, is_read, created_at FROM {NOTIFICATION_TABLE}
-            WHERE user_id = %s
-            ORDER BY created_at DESC
+            SELECT id, type, title, content, is_read, created_at FROM {NOTIFICATION_TABLE}
+            WHERE user_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
             """,
-            (user_id,)
+            (user_id, last_id, limit)
         )
         return self.cur.fetchall()
     
+    def count_unread(self, user_id):
+        self.cur.execute(
+            f"SELECT count(*) AS unread FROM {NOTIFICATION_TABLE} WHERE user_id = %s AND is_read = FALSE",
+            (user_id,)
+        )
+        return self.cur.fetchone()['unread']
+    
     def delete_notification(self, notification_id):
         self.cur.execute(
             f"""
             DELETE FROM {NOTIFICATION_TABLE}
             WHERE id = %s
-            RETURNING id
+            RETURNING id, user_id, is_read
             """,
             (notification_id,)
         )
-        return self.cur.fetchone()['id']
+        notification = self.cur.fetchone()
+        if notification is None:
+            return None
+        if not notification['is_read']:
+            user_id = notification['user_id']
+            DbPool.on_commit(lambda: UnreadCounterService.adjust(user_id, -1))
+        return notification['id']
     
     def delete_notifications_by_user(self, user_id):
         self.cur.execute(
@@ -71,4 +163,117 @@ class NotificationQueryManager:
             """,
             (user_id,)
         )
-        return [row['id'] for row in self.cur.fetchall()]
\ No newline at end of file
+        DbPool.on_commit(lambda: UnreadCounterService.reset(user_id, 0))
+        return [row['id'] for row in self.cur.fetchall()]
+
+    def delete_read_notifications(self, user_id, older_than):
+        """Delete the user's read notifications created before `older_than`.
+        The unread counter is unaffected."""
+        self.cur.execute(
+            f"""
+            DELETE FROM {NOTIFICATION_TABLE}
+            WHERE user_id = %s AND is_read = TRUE AND created_at < %s
+            RETURNING id
+            """,
+            (user_id, older_than)
+        )
+        return [row['id'] for row in self.cur.fetchall()]
+
+class NotificationOutboxQueryManager:
+    """Notification events waiting for notification_worker.py."""
+    def __init__(self, cursor):
+        self.cur = cursor
+
+    def enqueue(self, event_type, payload):
+        self.cur.execute(
+            f"INSERT INTO {NOTIFICATION_OUTBOX_TABLE} (event_type, payload, created_at) VALUES (%s, %s, %s)",
+            (event_type, Json(payload), dt.datetime.now())
+        )
+
+    def enqueue_appointment_reminders(self, event_type, reminder_window, start, end, limit, booked_ahead=None):
+        """Enqueue a reminder event for up to `limit` scheduled appointments
+        in (start, end] not yet reminded for `reminder_window`, in one
+        statement. With `booked_ahead` (a timedelta), appointments booked
+        less than that long before the visit are left out. Each reminder is
+        recorded in appointment_reminders, and a concurrent scheduler's
+        conflicting insert is skipped, so no appointment is reminded twice.
+        Returns the number of events enqueued."""
+        self.cur.execute(
+            f"""
+            WITH due AS (
+                SELECT a.id, a.appointment_date, p.user_id, d.last_name AS doctor_name
+                FROM {AppointmentTables.APPOINTMENTS.value} a
+                JOIN {UserTables.PATIENTS.value} p ON p.id = a.patient_id
+                JOIN {UserTables.DOCTORS.value} d ON d.id = a.doctor_id
+                WHERE a.status = %s AND a.appointment_date > %s AND a.appointment_date <= %s
+                AND (%s::interval IS NULL OR a.created_at IS NULL OR a.created_at <= a.appointment_date - %s::interval)
+                AND NOT EXISTS (
+                    SELECT 1 FROM {AppointmentTables.APPOINTMENT_REMINDERS.value} r
+                    WHERE r.appointment_id = a.id AND r.reminder_window = %s
+                )
+                ORDER BY a.appointment_date
+                LIMIT %s
+            ), reminded AS (
+                INSERT INTO {AppointmentTables.APPOINTMENT_REMINDERS.value} (appointment_id, reminder_window)
+                SELECT id, %s FROM due
+                ON CONFLICT DO NOTHING
+                RETURNING appointment_id
+            )
+            INSERT INTO {NOTIFICATION_OUTBOX_TABLE} (event_type, payload, created_at)
+            SELECT %s, jsonb_build_object(
+                'user_id', due.user_id,
+                'doctor_name', due.doctor_name,
+                'appointment_date', to_char(due.appointment_date, 'DD.MM.YYYY HH24:MI')
+            ), %s
+            FROM reminded JOIN due ON due.id = reminded.appointment_id
+            """,
+            (
+                AppointmentStatus.SCHEDULED.value, start, end, booked_ahead, booked_ahead, reminder_window, limit,
+                reminder_window,
+                event_type, dt.datetime.now(),
+            )
+        )
+        return self.cur.rowcount
+
+    def claim_batch(self, limit):
+        """Lock up to `limit` due events, oldest first, until the transaction
+        ends. Events locked by another worker are skipped, not waited for."""
+        self.cur.execute(
+            f"""
+            SELECT id, event_type, payload, created_at, attempts FROM {NOTIFICATION_OUTBOX_TABLE}
+            WHERE failed_at IS NULL AND available_at <= LOCALTIMESTAMP
+            ORDER BY available_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """,
+            (limit,)
+        )
+        return self.cur.fetchall()
+
+    def delete_events(self, event_ids):
+        self.cur.execute(f"DELETE FROM {NOTIFICATION_OUTBOX_TABLE} WHERE id = ANY(%s)", (list(event_ids),))
+
+    def retry_event(self, event_id, error, delay_seconds):
+        self.cur.execute(
+            f"""
+            UPDATE {NOTIFICATION_OUTBOX_TABLE}
+            SET attempts = attempts + 1, last_error = %s, available_at = LOCALTIMESTAMP + make_interval(secs => %s)
+            WHERE id = %s
+            """,
+            (error, delay_seconds, event_id)
+        )
+
+    def fail_event(self, event_id, error):
+        self.cur.execute(
+            f"""
+            UPDATE {NOTIFICATION_OUTBOX_TABLE}
+            SET attempts = attempts + 1, last_error = %s, failed_at = LOCALTIMESTAMP
+            WHERE id = %s
+            """,
+            (error, event_id)
+        )
+
+    def backlog(self):
+        """Events still to deliver (due or waiting for a retry)."""
+        self.cur.execute(f"SELECT count(*) AS pending FROM {NOTIFICATION_OUTBOX_TABLE} WHERE failed_at IS NULL")
+        return self.cur.fetchone()['pending']
@@ -1,52 +1,102 @@
-from utils.queries import create_placeholder_data
-from constants import AppointmentTables
+from utils.queries import create_placeholder_data, create_values_list, fetch_rows
+from constants import AppointmentTables, UserTables
 import datetime as dt
+from utils.pagination import desc_keyset_condition
+from db_connection import DbPool, PreparedStatement
+from services.prescription_cache_service import PrescriptionCacheService
 
+# First prescription code; must match prescription_code_seq (migration 0005)
 CODE_MINIMAL_VALUE = 1000
 
+PRESCRIPTION_COLUMNS = "id, doctor_id, patient_id, appointment_id, code, issued_at, notes"
+ITEM_COLUMNS = ('medication_name', 'dosage', 'instructions')
+# Items of prescription `p` as a JSON array, via idx_prescription_items_prescription
+ITEMS_JSON = f"""COALESCE((
+    SELECT json_agg(json_build_object(
+        'id', i.id,
+        'medication_name', i.medication_name,
+        'dosage', i.dosage,
+        'instructions', i.instructions
+    ) ORDER BY i.id)
+    FROM {AppointmentTables.PRESCRIPTION_ITEMS.value} i
+    WHERE i.prescription_id = p.id
+), '[]'::json)"""
+
+GET_PRESCRIPTION = PreparedStatement(
+    "prescription_get_by_id",
+    f"SELECT {PRESCRIPTION_COLUMNS} FROM {AppointmentTables.PRESCRIPTIONS.value} WHERE id = %s"
+)
+GET_PRESCRIPTION_BY_APPOINTMENT = PreparedStatement(
+    "prescription_get_by_appointment",
+    f"SELECT {PRESCRIPTION_COLUMNS} FROM {AppointmentTables.PRESCRIPTIONS.value} WHERE appointment_id = %s"
+)
+# The owners' user ids let the lookup authorize a (cached) result without
+# further queries
+GET_PRESCRIPTION_BY_CODE = PreparedStatement(
+    "prescription_get_by_code",
+    f"""SELECT p.id, p.doctor_id, p.patient_id, p.appointment_id, p.code, p.issued_at, p.notes,
+        pa.user_id AS patient_user_id, d.user_id AS doctor_user_id,
+        {ITEMS_JSON} AS items
+    FROM {AppointmentTables.PRESCRIPTIONS.value} p
+    LEFT JOIN {UserTables.PATIENTS.value} pa ON pa.id = p.patient_id
+    LEFT JOIN {UserTables.DOCTORS.value} d ON d.id = p.doctor_id
+    WHERE p.code = %s"""
+)
+
 class PrescriptionQueryHelper:
     def __init__(self, cursor):
         self.cur = cursor
 
     def get_prescription_by_id(self, prescription_id):
-        self.cur.execute(
-            f"""
-            SELECT * FROM {AppointmentTables.PRESCRIPTIONS.value}
-            WHERE id = %s
-            """,
-            (prescription_id,)
-        )
+        self.cur.execute_prepared(GET_PRESCRIPTION, (prescription_id,))
         return self.cur.fetchone()
     
-    def get_prescriptions_by_patient(self, patient_id):
-        self.cur.execute(
-            f"""
+    def get_prescriptions_by_patient(self, patient_id, stream=False, compact=False):
+        query = f"""
             SELECT * FROM {AppointmentTables.PRESCRIPTIONS.value}
             WHERE patient_id = %s
             ORDER BY issued_at DESC
-            """,
-            (patient_id,)
-        )
-        return self.cur.fetchall()
-
+            """
+        return fetch_rows(self.cur, query, (patient_id,), stream=stream, compact=compact)
+    
+    def get_prescription_by_code(self, code):
+        self.cur.execute_prepared(GET_PRESCRIPTION_BY_CODE, (code,))
+        return self.cur.fetchone()
+    
     def get_prescription_by_appointment(self, appointment_id):
-        self.cur.execute(
-            f"""
-            SELECT * FROM {AppointmentTables.PRESCRIPTIONS.value}
-            WHERE appointment_id = %s
-            """,
-            (appointment_id,)
-        )
+        self.cur.execute_prepared(GET_PRESCRIPTION_BY_APPOINTMENT, (appointment_id,))
         return self.cur.fetchone()
     
-    def get_prescriptions_by_doctor(self, doctor_id):
-        self.cur.execute(
-            f"""
+    def get_prescriptions_by_doctor(self, doctor_id, stream=False, compact=False):
+        query = f"""
             SELECT * FROM {AppointmentTables.PRESCRIPTIONS.value}
             WHERE doctor_id = %s
             ORDER BY issued_at DESC
+            """
+        return fetch_rows(self.cur, query, (doctor_id,), stream=stream, compact=compact)
+    
+    def get_prescriptions_with_items(self, owner_column, owner_id, limit, after=None):
+        """One page of prescriptions, newest first, each with its items
+        aggregated in SQL (one indexed lookup per prescription instead of a
+        query per prescription from the client). `after` is the
+        (issued_at, id) of the last row of the previous page; fetches
+        limit + 1 rows so the caller can tell whether there is more."""
+        conditions, params = [f"p.{owner_column} = %s"], [owner_id]
+        if after is not None:
+            condition, after_params = desc_keyset_condition("p.issued_at", "p.id", after)
+            conditions.append(condition)
+            params.extend(after_params)
+
+        self.cur.execute(
+            f"""
+            SELECT p.id, p.doctor_id, p.patient_id, p.appointment_id, p.code, p.issued_at, p.notes,
+                {ITEMS_JSON} AS items
+            FROM {AppointmentTables.PRESCRIPTIONS.value} p
+            WHERE {' AND '.join(conditions)}
+            ORDER BY p.issued_at DESC, p.id DESC
+            LIMIT %s
             """,
-            (doctor_id,)
+            (*params, limit + 1)
         )
         return self.cur.fetchall()
     
@@ -60,71 +110,68 @@ class PrescriptionQueryHelper:
         )
         return self.cur.fetchall()
     
-    def get_smallest_prescription_code(self):
+    def insert_prescription_with_items(self, prescription_items, **prescription_data):
+        """Insert the prescription and all of its items in a single statement,
+        so a 20-item prescription costs one round trip like a 1-item one.
+        Returns (prescription_id, item_ids)."""
+        columns, placeholders, values = self._prescription_placeholder_data(prescription_data)
+        item_placeholders, item_values = create_values_list(prescription_items, ITEM_COLUMNS)
+
         self.cur.execute(
             f"""
-            SELECT MIN(code) as min_code FROM {AppointmentTables.PRESCRIPTIONS.value}
-            """
+            WITH prescription AS (
+                INSERT INTO {AppointmentTables.PRESCRIPTIONS.value} ({columns})
+                VALUES ({placeholders})
+                RETURNING id
+            ), items AS (
+                INSERT INTO {AppointmentTables.PRESCRIPTION_ITEMS.value} (prescription_id, {', '.join(ITEM_COLUMNS)})
+                SELECT prescription.id, item.*
+                FROM prescription, (VALUES {item_placeholders}) AS item ({', '.join(ITEM_COLUMNS)})
+                RETURNING id
+            )
+            SELECT (SELECT id FROM prescription) AS id, ARRAY(SELECT id FROM items ORDER BY id) AS item_ids
+            """,
+            (*values, *item_values)
         )
         result = self.cur.fetchone()
-        return result['min_code'] if result and result['min_code'] is not None else CODE_MINIMAL_VALUE - 1
+        return result['id'], result['item_ids']
     
-    def insert_prescription(self, **prescription_data):
-        allowed_columns = {'appointment_id', 'issued_at', 'patient_id', 'doctor_id', 'notes', 'code'}
-        smallest_code = self.get_smallest_prescription_code()
-        prescription_data['code'] = smallest_code + 1
-
-        columns, placeholders, values = create_placeholder_data({
+    def _prescription_placeholder_data(self, prescription_data):
+        # `code` is left to the column default, prescription_code_seq, which
+        # starts at CODE_MINIMAL_VALUE
+        allowed_columns = {'appointment_id', 'issued_at', 'patient_id', 'doctor_id', 'notes'}
+        return create_placeholder_data({
             **prescription_data,
             "issued_at": prescription_data.get("issued_at", dt.datetime.now())
         }, allowed_columns)
-
-        self.cur.execute(
-            f"""
-            INSERT INTO {AppointmentTables.PRESCRIPTIONS.value} ({columns})
-            VALUES ({placeholders})
-            RETURNING id
-            """,
-            tuple(values)
-        )
-        return self.cur.fetchone()['id']
-    
-    def insert_prescription_items(self, prescription_id, prescription_items):
-        prescription_values = []
-        allowed_columns = {'prescription_id', 'medication_name', 'dosage', 'instructions'}
-        for item in prescription_items:
-            columns, placeholders, values = create_placeholder_data({**item, "prescription_id": prescription_id}, allowed_columns)
-            prescription_values.append(tuple(values))
-
-        self.cur.execute(
-            f"""
-            INSERT INTO {AppointmentTables.PRESCRIPTION_ITEMS.value} ({columns})
-            VALUES ({placeholders})
-            RETURNING id
-            """,
-            tuple(values)
-        )
-        return self.cur.fetchone()['id']
     
     def delete_prescription(self, prescription_id):
         self.cur.execute(
             f"""
             DELETE FROM {AppointmentTables.PRESCRIPTIONS.value} WHERE id = %s
-            RETURNING id
+            RETURNING id, code
             """,
             (prescription_id,)
         )
-        return self.cur.fetchone()['id']
+        deleted = self.cur.fetchone()
+        code = deleted['code']
+        DbPool.on_commit(lambda: PrescriptionCacheService.invalidate(code))
+        return deleted['id']
     
     def delete_prescription_item(self, prescription_item_id):
         self.cur.execute(
             f"""
-            DELETE FROM {AppointmentTables.PRESCRIPTION_ITEMS.value} WHERE id = %s
-            RETURNING id
+            DELETE FROM {AppointmentTables.PRESCRIPTION_ITEMS.value} i
+            USING {AppointmentTables.PRESCRIPTIONS.value} p
+            WHERE i.id = %s AND p.id = i.prescription_id
+            RETURNING i.id, p.code
             """,
             (prescription_item_id,)
         )
-        return self.cur.fetchone()['id']
+        deleted = self.cur.fetchone()
+        code = deleted['code']
+        DbPool.on_commit(lambda: PrescriptionCacheService.invalidate(code))
+        return deleted['id']
     
 class PrescriptionQueryManager:
     def __init__(self, cursor):
@@ -132,30 +179,37 @@ class PrescriptionQueryManager:
         self.prescription = PrescriptionQueryHelper(cursor)
 
     def create_prescription(self, **prescription_data):
-        prescription_id = self.prescription.insert_prescription(**prescription_data)
+        prescription_items = prescription_data.pop('prescription_items', None)
+        if not prescription_items:
+            raise ValueError("At least one prescription item is required")
+
+        prescription_id, item_ids = self.prescription.insert_prescription_with_items(prescription_items, **prescription_data)
         if not prescription_id:
             raise Exception("Failed to create prescription")
-        
-        prescription_item_id = self.prescription.insert_prescription_items(
-            prescription_id,
-            prescription_items=prescription_data.get('prescription_items', []),
-        )
-
-        if not prescription_item_id:
-            raise Exception("Failed to create prescription item")
+        if len(item_ids) != len(prescription_items):
+            raise Exception("Failed to create prescription items")
         return prescription_id
     
     def get_prescription(self, prescription_id):
         return self.prescription.get_prescription_by_id(prescription_id)
     
-    def get_prescriptions_by_patient(self, user_id):
-        return self.prescription.get_prescriptions_by_patient(user_id)
+    def get_prescriptions_by_patient(self, user_id, stream=False, compact=False):
+        return self.prescription.get_prescriptions_by_patient(user_id, stream=stream, compact=compact)
+    
+    def get_prescriptions_with_items_by_patient(self, patient_id, limit, after=None):
+        return self.prescription.get_prescriptions_with_items('patient_id', patient_id, limit, after)
+    
+    def get_prescriptions_with_items_by_doctor(self, doctor_id, limit, after=None):
+        return self.prescription.get_prescriptions_with_items('doctor_id', doctor_id, limit, after)
     
     def get_prescription_by_appointment(self, appointment_id):
         return self.prescription.get_prescription_by_appointment(appointment_id)
     
-    def get_prescriptions_by_doctor(self, doctor_id):
-        return self.prescription.get_prescriptions_by_doctor(doctor_id)
+    def get_prescription_by_code(self, code):
+        return self.prescription.get_prescription_by_code(code)
+    
+    def get_prescriptions_by_doctor(self, doctor_id, stream=False, compact=False):
+        return self.prescription.get_prescriptions_by_doctor(doctor_id, stream=stream, compact=compact)
     
     def remove_prescription(self, prescription_id):
         return self.prescription.delete_prescription(prescription_id)
@@ -2,6 +2,32 @@ from constants import UserRole, UserTables, specializations
 from utils.queries import create_placeholder_data, get_set_clause_and_values
 import datetime as dt
 import bcrypt
+from db_connection import PreparedStatement
+
+GET_USER_BY_ID = PreparedStatement(
+    "user_get_by_id",
+    f"SELECT id, email, role, is_active, created_at FROM {UserTables.USERS.value} WHERE id = %s"
+)
+GET_USER_BY_EMAIL = PreparedStatement(
+    "user_get_by_email",
+    f"SELECT id, email, password_hash, role, is_active, created_at FROM {UserTables.USERS.value} WHERE email = %s"
+)
+GET_PATIENT = PreparedStatement(
+    "patient_get_by_id",
+    f"SELECT id, user_id, first_name, last_name, pesel, phone FROM {UserTables.PATIENTS.value} WHERE id = %s"
+)
+GET_PATIENT_BY_USER_ID = PreparedStatement(
+    "patient_get_by_user_id",
+    f"SELECT id, user_id, first_name, last_name, pesel, phone FROM {UserTables.PATIENTS.value} WHERE user_id = %s"
+)
+GET_DOCTOR = PreparedStatement(
+    "doctor_get_by_id",
+    f"SELECT id, user_id, first_name, last_name, specialization, license_number FROM {UserTables.DOCTORS.value} WHERE id = %s"
+)
+GET_DOCTOR_BY_USER_ID = PreparedStatement(
+    "doctor_get_by_user_id",
+    f"SELECT id, user_id, first_name, last_name, specialization, license_number FROM {UserTables.DOCTORS.value} WHERE user_id = %s"
+)
 
 class PatientQueryHelper:
     def __init__(self, cursor):
@@ -22,23 +48,11 @@ class PatientQueryHelper:
         return self.cur.fetchone()['id']
     
     def get_patient_by_user_id(self, user_id):
-        self.cur.execute(
-            f"""
-            SELECT id, user_id, first_name, last_name, pesel, phone
-            FROM {UserTables.PATIENTS.value} WHERE user_id = %s
-            """,
-            (user_id,)
-        )
+        self.cur.execute_prepared(GET_PATIENT_BY_USER_ID, (user_id,))
         return self.cur.fetchone()
     
     def get_patient(self, patient_id):
-        self.cur.execute(
-            f"""
-            SELECT id, user_id, first_name, last_name, pesel, phone
-            FROM {UserTables.PATIENTS.value} WHERE id = %s
-            """,
-            (patient_id,)
-        )
+        self.cur.execute_prepared(GET_PATIENT, (patient_id,))
         return self.cur.fetchone()
     
     def delete_patient_by_user_id(self, user_id):
@@ -93,23 +107,11 @@ class DoctorQueryHelper:
         return self.cur.fetchone()['id']
     
     def get_doctor_by_user_id(self, user_id):
-        self.cur.execute(
-            f"""
-            SELECT id, user_id, first_name, last_name, specialization, license_number
-            FROM {UserTables.DOCTORS.value} WHERE user_id = %s
-            """,
-            (user_id,)
-        )
+        self.cur.execute_prepared(GET_DOCTOR_BY_USER_ID, (user_id,))
         return self.cur.fetchone()
     
     def get_doctor(self, doctor_id):
-        self.cur.execute(
-            f"""
-            SELECT id, user_id, first_name, last_name, specialization, license_number
-            FROM {UserTables.DOCTORS.value} WHERE id = %s
-            """,
-            (doctor_id,)
-        )
+        self.cur.execute_prepared(GET_DOCTOR, (doctor_id,))
         return self.cur.fetchone()
     
     def get_doctors_by_specialization(self, specialization):
@@ -179,21 +181,11 @@ class UserQueryHelper:
         return self.cur.fetchone()['id']
     
     def get_user_by_id(self, user_id):
-        self.cur.execute(
-            f"""
-            SELECT id, email, role, is_active, created_at FROM {UserTables.USERS.value} WHERE id = %s
-            """,
-            (user_id,)
-        )
+        self.cur.execute_prepared(GET_USER_BY_ID, (user_id,))
         return self.cur.fetchone()
     
     def get_user_by_email(self, email):
-        self.cur.execute(
-            f"""
-            SELECT id, email, password_hash, role, is_active, created_at FROM {UserTables.USERS.value} WHERE email = %s
-            """,
-            (email,)
-        )
+        self.cur.execute_prepared(GET_USER_BY_EMAIL, (email,))
         return self.cur.fetchone()
     
     def get_pending_users(self):
@@ -5,6 +5,8 @@ from typing import Optional
 
 load_dotenv()
 
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1))
+
 class RedisClient:
     _client: Optional[redis.Redis] = None
 
@@ -18,13 +20,16 @@ class RedisClient:
                 port=int(os.getenv('REDIS_PORT', 6379)),
                 db=int(os.getenv('REDIS_DB', 0)),
                 password=redis_password if redis_password else None,
-                decode_responses=True
+                decode_responses=True,
+                # A hung Redis must not eat the whole request budget
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT
             )
 
             try:
                 cls._client.ping()
                 print("✓ Redis connected successfully")
-            except redis.ConnectionError as e:
+            except (redis.ConnectionError, redis.TimeoutError) as e:
                 print(f"✗ Redis connection failed: {e}")
                 cls._client = None
                 
@@ -0,0 +1,94 @@
+"""Sends appointment reminders: every APPOINTMENT_REMINDER_INTERVAL seconds
+it enqueues a reminder event for each scheduled appointment entering one of
+the reminder windows (24h and 1h before the visit by default).
+notification_worker.py then delivers them like any other notification.
+
+Reminders are recorded in appointment_reminders, so restarts and extra
+replicas never send one twice; a transaction-level advisory lock keeps
+replicas from scanning the same batch at the same time.
+
+Usage (from the server directory):
+    python reminder_scheduler.py
+"""
+import datetime as dt
+import os
+import signal
+import threading
+from dotenv import load_dotenv
+from db_connection import DbPool
+from queries.notification import NotificationOutboxQueryManager
+from services.notification_service import NotificationEvent
+
+load_dotenv()
+
+INTERVAL = float(os.getenv('APPOINTMENT_REMINDER_INTERVAL', 60))
+BATCH_SIZE = int(os.getenv('APPOINTMENT_REMINDER_BATCH_SIZE', 500))
+# Hours before the visit at which reminders go out
+REMINDER_HOURS = sorted(
+    {float(hours) for hours in os.getenv('APPOINTMENT_REMINDER_HOURS', '24,1').split(',') if hours.strip()},
+    reverse=True
+)
+# Any fixed key works, it only has to be the same for every replica
+REMINDER_LOCK_KEY = 2718281828
+MAX_ERROR_BACKOFF = 300
+
+def reminder_windows():
+    """(name, nearer, further, booked_ahead) of each window. A window covers
+    visits between its own lead time and the next shorter one. Except for
+    the nearest window, it also skips visits booked less than its lead time
+    ahead, so a visit booked at short notice only gets the nearest
+    reminder."""
+    windows = []
+    for index, hours in enumerate(REMINDER_HOURS):
+        nearest = index + 1 == len(REMINDER_HOURS)
+        nearer = 0 if nearest else REMINDER_HOURS[index + 1]
+        further = dt.timedelta(hours=hours)
+        windows.append((f"{hours:g}h", dt.timedelta(hours=nearer), further, None if nearest else further))
+    return windows
+
+def enqueue_window(name, nearer, further, booked_ahead):
+    """Enqueue the window's due reminders, BATCH_SIZE per transaction. Stops
+    early when another replica holds the lock. Returns the number enqueued."""
+    total = 0
+    while True:
+        with DbPool.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (REMINDER_LOCK_KEY,))
+            if not cur.fetchone()['locked']:
+                return total
+            now = dt.datetime.now()
+            enqueued = NotificationOutboxQueryManager(cur).enqueue_appointment_reminders(
+                NotificationEvent.APPOINTMENT_REMINDER, name, now + nearer, now + further, BATCH_SIZE,
+                booked_ahead=booked_ahead
+            )
+        total += enqueued
+        if enqueued < BATCH_SIZE:
+            return total
+
+def run(stop: threading.Event):
+    windows = reminder_windows()
+    print(f"✓ Reminder scheduler started (windows {', '.join(name for name, _, _, _ in windows)})")
+    failures = 0
+    while not stop.is_set():
+        try:
+            for name, nearer, further, booked_ahead in windows:
+                enqueued = enqueue_window(name, nearer, further, booked_ahead)
+                if enqueued:
+                    print(f"✓ Enqueued {enqueued} {name} appointment reminders")
+            failures = 0
+        except Exception as e:
+            failures += 1
+            print(f"✗ Reminder run failed: {str(e)}")
+            stop.wait(min(INTERVAL * 2 ** failures, MAX_ERROR_BACKOFF))
+            continue
+        stop.wait(INTERVAL)
+    print("✓ Reminder scheduler stopped")
+
+if __name__ == "__main__":
+    stop = threading.Event()
+    # Finish the current run, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        run(stop)
+    finally:
+        DbPool.closeall()
@@ -1,5 +1,9 @@
-from queries.notification import NotificationQueryManager
+import json
+import redis
+from queries.notification import NotificationOutboxQueryManager
 from constants import NotificationType
+from redis_connection import RedisClient
+from services.notification_stream_service import NOTIFICATION_CHANNEL
 
 class NotificationMessagesManager:
     @staticmethod
@@ -27,65 +31,108 @@ class NotificationMessagesManager:
     def get_content_for_prescription_created(doctor_name):
         return f"Dr. {doctor_name} wystawił Ci nową receptę"
     
+    @staticmethod
+    def get_content_for_appointment_reminder(doctor_name, appointment_date):
+        return f"Przypominamy o wizycie u Dr. {doctor_name} w dniu {appointment_date}"
+    
     @staticmethod
     def get_account_activated_message(email):
         return f"Twoje konto lekarza ({email}) zostało aktywowane przez administratora"
 
+class NotificationEvent:
+    APPOINTMENT_CREATED = 'appointment_created'
+    APPOINTMENT_STATUS_CHANGED = 'appointment_status_changed'
+    PRESCRIPTION_CREATED = 'prescription_created'
+    ACCOUNT_ACTIVATED = 'account_activated'
+    APPOINTMENT_REMINDER = 'appointment_reminder'
+
 class NotificationService:
+    """`notify_*` only record an event in the notification outbox, in the
+    caller's transaction: it is delivered exactly when that transaction
+    commits. notification_worker.py renders and inserts the notifications."""
+
     @staticmethod
     def notify_appointment_created(cur, user_id, doctor_name, appointment_date):
         """Send notification when appointment is created"""
-        try:
-            notification_manager = NotificationQueryManager(cur)
-            notification_manager.insert_notification(
-                user_id=user_id,
-                type=NotificationType.APPOINTMENT_REMINDER.value,
-                title="Wizyta Utworzona",
-                content=NotificationMessagesManager.get_content_for_appointment_created(doctor_name, appointment_date),
-                is_read=False
-            )
-        except Exception as e:
-            print(f"Failed to send notification: {str(e)}")
+        NotificationOutboxQueryManager(cur).enqueue(NotificationEvent.APPOINTMENT_CREATED, {
+            "user_id": user_id,
+            "doctor_name": doctor_name,
+            "appointment_date": appointment_date,
+        })
     
     @staticmethod
     def notify_appointment_status_changed(cur, user_id, doctor_name, status):
-        try:
-            notification_manager = NotificationQueryManager(cur)
-            notification_manager.insert_notification(
-                user_id=user_id,
-                type=NotificationType.APPOINTMENT_REMINDER.value,
-                title=NotificationMessagesManager.get_title_for_appointment_status_changed(status),
-                content=NotificationMessagesManager.get_content_for_appointment_status_changed(doctor_name, status),
-                is_read=False
-            )
-        except Exception as e:
-            print(f"Failed to send notification: {str(e)}")
+        NotificationOutboxQueryManager(cur).enqueue(NotificationEvent.APPOINTMENT_STATUS_CHANGED, {
+            "user_id": user_id,
+            "doctor_name": doctor_name,
+            "status": status,
+        })
     
     @staticmethod
     def notify_prescription_created(cur, user_id, doctor_name):
-        try:
-            notification_manager = NotificationQueryManager(cur)
-            notification_manager.insert_notification(
-            user_id=user_id,
-                type=NotificationType.NEW_PRESCRIPTION.value,
-                title="Nowa Recepta",
-                content=NotificationMessagesManager.get_content_for_prescription_created(doctor_name),
-                is_read=False
-            )
-        except Exception as e:
-            print(f"Failed to send notification: {str(e)}")
+        NotificationOutboxQueryManager(cur).enqueue(NotificationEvent.PRESCRIPTION_CREATED, {
+            "user_id": user_id,
+            "doctor_name": doctor_name,
+        })
     
     @staticmethod
     def notify_account_activated(cur, user_id, email):
         """Send notification when doctor account is activated"""
+        NotificationOutboxQueryManager(cur).enqueue(NotificationEvent.ACCOUNT_ACTIVATED, {
+            "user_id": user_id,
+            "email": email,
+        })
+
+    @staticmethod
+    def publish(notifications):
+        """Push committed notifications to their users' open streams (see
+        NotificationStreamService), in one round trip. Best effort: a client
+        that misses one still finds it in its inbox."""
+        redis_client = RedisClient.get_client()
+        if not redis_client or not notifications:
+            return
         try:
-            notification_manager = NotificationQueryManager(cur)
-            notification_manager.insert_notification(
-                user_id=user_id,
-                type=NotificationType.GENERAL_NOTIFICATION.value,
-                title="Konto Aktywowane",
-                content=NotificationMessagesManager.get_account_activated_message(email),
-                is_read=False
-            )
-        except Exception as e:
-            print(f"Failed to send notification: {str(e)}")
\ No newline at end of file
+            pipeline = redis_client.pipeline(transaction=False)
+            for notification in notifications:
+                pipeline.publish(NOTIFICATION_CHANNEL, json.dumps({
+                    "user_id": notification['user_id'],
+                    "notification": {
+                        "id": notification['id'],
+                        "type": notification['type'],
+                        "title": notification['title'],
+                        "content": notification['content'],
+                        "is_read": notification['is_read'],
+                        "created_at": notification['created_at'].isoformat(),
+                    },
+                }))
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Failed to publish notifications: {str(e)}")
+
+    @staticmethod
+    def render(event_type, payload):
+        """The notification row (user_id, type, title, content) for an outbox
+        event. Raises ValueError for an unknown event type."""
+        if event_type == NotificationEvent.APPOINTMENT_CREATED:
+            type = NotificationType.APPOINTMENT_REMINDER.value
+            title = "Wizyta Utworzona"
+            content = NotificationMessagesManager.get_content_for_appointment_created(payload['doctor_name'], payload['appointment_date'])
+        elif event_type == NotificationEvent.APPOINTMENT_STATUS_CHANGED:
+            type = NotificationType.APPOINTMENT_REMINDER.value
+            title = NotificationMessagesManager.get_title_for_appointment_status_changed(payload['status'])
+            content = NotificationMessagesManager.get_content_for_appointment_status_changed(payload['doctor_name'], payload['status'])
+        elif event_type == NotificationEvent.PRESCRIPTION_CREATED:
+            type = NotificationType.NEW_PRESCRIPTION.value
+            title = "Nowa Recepta"
+            content = NotificationMessagesManager.get_content_for_prescription_created(payload['doctor_name'])
+        elif event_type == NotificationEvent.ACCOUNT_ACTIVATED:
+            type = NotificationType.GENERAL_NOTIFICATION.value
+            title = "Konto Aktywowane"
+            content = NotificationMessagesManager.get_account_activated_message(payload['email'])
+        elif event_type == NotificationEvent.APPOINTMENT_REMINDER:
+            type = NotificationType.APPOINTMENT_REMINDER.value
+            title = "Przypomnienie o Wizycie"
+            content = NotificationMessagesManager.get_content_for_appointment_reminder(payload['doctor_name'], payload['appointment_date'])
+        else:
+            raise ValueError(f"Unknown notification event: {event_type}")
+        return {"user_id": payload['user_id'], "type": type, "title": title, "content": content}
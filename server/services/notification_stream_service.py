@@ -0,0 +1,105 @@
+import json
+import os
+import queue
+import threading
+import time
+from redis_connection import RedisClient
+from typing import Dict, Set
+
+NOTIFICATION_CHANNEL = "notifications:delivered"
+# Messages buffered per open stream; a client that falls further behind
+# loses messages and has to re-read its inbox
+STREAM_QUEUE_SIZE = int(os.getenv('NOTIFICATION_STREAM_QUEUE_SIZE', 100))
+RECONNECT_DELAY = 1
+
+class NotificationStreamService:
+    """Fans notifications published on NOTIFICATION_CHANNEL out to the
+    server-sent event streams open in this process. Each process holds a
+    single Redis subscription, read by one background thread, however many
+    streams are open; each stream gets a bounded queue of ready-to-send
+    events."""
+    _subscribers: Dict[int, Set[queue.Queue]] = {}
+    _lock = threading.Lock()
+    _listener = None
+    _dropped = 0
+
+    @classmethod
+    def subscribe(cls, user_id) -> queue.Queue:
+        messages = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with cls._lock:
+            cls._subscribers.setdefault(user_id, set()).add(messages)
+            if cls._listener is None:
+                cls._listener = threading.Thread(target=cls._listen, name="notification-stream", daemon=True)
+                cls._listener.start()
+        return messages
+
+    @classmethod
+    def unsubscribe(cls, user_id, messages: queue.Queue) -> None:
+        with cls._lock:
+            streams = cls._subscribers.get(user_id)
+            if streams is None:
+                return
+            streams.discard(messages)
+            if not streams:
+                del cls._subscribers[user_id]
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                "users": len(cls._subscribers),
+                "streams": sum(len(streams) for streams in cls._subscribers.values()),
+                "dropped": cls._dropped,
+            }
+
+    @staticmethod
+    def format_event(notification) -> str:
+        """The server-sent event for a notification as published by
+        NotificationService.publish."""
+        return f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+    @classmethod
+    def _dispatch(cls, data) -> None:
+        message = json.loads(data)
+        notification = message['notification']
+        # Built once here, not once per stream; queued with its id so a
+        # resumed stream can skip what it already replayed
+        event = (notification['id'], cls.format_event(notification))
+        with cls._lock:
+            streams = list(cls._subscribers.get(message['user_id'], ()))
+        for messages in streams:
+            try:
+                messages.put_nowait(event)
+            except queue.Full:
+                with cls._lock:
+                    cls._dropped += 1
+
+    @classmethod
+    def _listen(cls) -> None:
+        while True:
+            redis_client = RedisClient.get_client()
+            if not redis_client:
+                time.sleep(RECONNECT_DELAY)
+                continue
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(NOTIFICATION_CHANNEL)
+                print("✓ Subscribed to notification pub/sub")
+                while True:
+                    # A bounded wait: the client's socket timeout applies to reads
+                    message = pubsub.get_message(timeout=RECONNECT_DELAY)
+                    if message:
+                        try:
+                            cls._dispatch(message['data'])
+                        except (ValueError, KeyError, TypeError) as e:
+                            print(f"✗ Malformed notification message: {str(e)}")
+            except Exception as e:
+                # Anything escaping here would end the thread and silently
+                # stop every stream of the process; resubscribe instead
+                print(f"✗ Notification pub/sub connection lost: {str(e)}")
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
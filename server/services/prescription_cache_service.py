@@ -0,0 +1,104 @@
+import json
+import os
+import redis
+from flask import current_app
+from redis_connection import RedisClient
+from typing import Any, Callable, Dict, Optional
+
+PRESCRIPTION_CACHE_TTL = int(os.getenv('PRESCRIPTION_CACHE_TTL_SECONDS', 300))
+
+# The entry is stored as "<generation>:<json>" and only served while its
+# generation is the code's current one. Invalidating bumps the generation
+# instead of deleting, so a load that read the database before the
+# invalidation cannot fill an entry anyone will read.
+# KEYS: generation, entry; ARGV: generation ttl (s)
+READ = """
+local generation = redis.call('get', KEYS[1])
+if generation then
+    -- Outlive every entry filled under it, so a generation never restarts
+    -- from 0 while an entry of an older count is still around
+    redis.call('expire', KEYS[1], ARGV[1])
+else
+    generation = '0'
+end
+local entry = redis.call('get', KEYS[2])
+local prefix = generation .. ':'
+if entry and string.sub(entry, 1, #prefix) == prefix then
+    return {generation, string.sub(entry, #prefix + 1)}
+end
+return {generation, false}
+"""
+# KEYS: generation, entry; ARGV: generation read before loading, json, ttl (s)
+FILL = """
+if (redis.call('get', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('set', KEYS[2], ARGV[1] .. ':' .. ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+class PrescriptionCacheService:
+    """Read-through Redis cache of prescriptions (header and items) by code,
+    for the pharmacy lookup. Entries are stored in their JSON response form
+    and invalidated when the prescription, one of its items or its
+    appointment is deleted. Without Redis every lookup goes to the
+    database. Loaders must read the primary: a lagging replica could fill
+    the new generation with a prescription deleted a moment ago."""
+
+    # The {code} hash tag keeps both keys of a code in one Redis Cluster slot
+    @staticmethod
+    def _generation_key(code):
+        return f"prescription:code:{{{code}}}:gen"
+
+    @staticmethod
+    def _entry_key(code):
+        return f"prescription:code:{{{code}}}"
+
+    @staticmethod
+    def get_or_load(code, loader: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        redis_client = RedisClient.get_client()
+        generation = None
+        if redis_client and PRESCRIPTION_CACHE_TTL > 0:
+            try:
+                # The generation is read before the database, never after
+                generation, cached = redis_client.eval(  # type: ignore
+                    READ, 2, PrescriptionCacheService._generation_key(code), PrescriptionCacheService._entry_key(code),
+                    PRESCRIPTION_CACHE_TTL * 2
+                )
+                if cached is not None:
+                    return json.loads(cached)
+            except redis.RedisError as e:
+                print(f"Failed to read prescription cache: {str(e)}")
+                generation = None
+
+        prescription = loader()
+        if prescription is None or generation is None:
+            return prescription
+
+        # The JSON round trip makes a hit return exactly what a miss returns
+        payload = current_app.json.dumps(prescription)
+        try:
+            # Skipped if the prescription was invalidated while loading
+            redis_client.eval(  # type: ignore
+                FILL, 2, PrescriptionCacheService._generation_key(code), PrescriptionCacheService._entry_key(code),
+                generation, payload, PRESCRIPTION_CACHE_TTL
+            )
+        except redis.RedisError as e:
+            print(f"Failed to fill prescription cache: {str(e)}")
+        return json.loads(payload)
+
+    @staticmethod
+    def invalidate(*codes) -> None:
+        """Bump each code's generation; call it once the change has committed
+        (DbPool.on_commit)."""
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline()
+            for code in codes:
+                pipe.incr(PrescriptionCacheService._generation_key(code))
+                pipe.expire(PrescriptionCacheService._generation_key(code), PRESCRIPTION_CACHE_TTL * 2)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"Failed to invalidate prescription cache: {str(e)}")
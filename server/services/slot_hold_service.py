@@ -0,0 +1,133 @@
+import hashlib
+import os
+import redis
+from redis_connection import RedisClient
+from typing import List, Optional
+
+SLOT_HOLD_TTL_MS = int(float(os.getenv('SLOT_HOLD_TTL_SECONDS', 120)) * 1000)
+
+# All holds are also indexed in one sorted set, scored by expiry (Redis
+# time, ms), so listings can exclude held slots in SQL before their LIMIT.
+# KEYS: slot, session, index; ARGV: session id, ttl ms, availability id, slot key prefix
+HOLD = """
+local holder = redis.call('get', KEYS[1])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+local time = redis.call('time')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+-- Take or refresh the slot key and the session key together, so they expire together
+redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+local previous = redis.call('get', KEYS[2])
+redis.call('set', KEYS[2], ARGV[3], 'PX', ARGV[2])
+redis.call('zadd', KEYS[3], now + ARGV[2], ARGV[3])
+redis.call('zremrangebyscore', KEYS[3], '-inf', now)
+-- A session holds one slot: release the one it held before
+if previous and previous ~= ARGV[3] then
+    local previous_key = ARGV[4] .. previous
+    if redis.call('get', previous_key) == ARGV[1] then
+        redis.call('del', previous_key)
+        redis.call('zrem', KEYS[3], previous)
+    end
+end
+return 1
+"""
+# KEYS: slot, session, index; ARGV: session id, availability id
+RELEASE = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[1])
+redis.call('zrem', KEYS[3], ARGV[2])
+if redis.call('get', KEYS[2]) == ARGV[2] then
+    redis.call('del', KEYS[2])
+end
+return 1
+"""
+# KEYS: index, session; returns the ids of live holds other than the session's
+HELD_BY_OTHERS = """
+local time = redis.call('time')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local own = redis.call('get', KEYS[2])
+local held = {}
+for _, id in ipairs(redis.call('zrangebyscore', KEYS[1], '(' .. now, '+inf')) do
+    if id ~= own then
+        table.insert(held, id)
+    end
+end
+return held
+"""
+SLOT_KEY_PREFIX = "slot_hold:"
+HOLD_INDEX_KEY = "slot_holds"
+
+class SlotHoldService:
+    """Short-lived reservations of availability slots during checkout, kept in
+    Redis so a rush on a few slots is settled there instead of in Postgres row
+    locks. A hold belongs to a session token and each session holds at most
+    one slot. Without Redis, holds are simply not enforced."""
+
+    @staticmethod
+    def _key(availability_id):
+        return f"{SLOT_KEY_PREFIX}{availability_id}"
+
+    @staticmethod
+    def _session_key(session_id):
+        return f"slot_hold_session:{session_id}"
+
+    @staticmethod
+    def session_id(token) -> str:
+        """What a hold records for its session: a hash, never the bearer token."""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def hold(availability_id, token, ttl_ms=SLOT_HOLD_TTL_MS) -> bool:
+        """Hold the slot for the session; holding it again refreshes the TTL.
+        Returns False when another session holds it."""
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            raise ConnectionError("Redis client is not initialized")
+
+        session_id = SlotHoldService.session_id(token)
+        return bool(redis_client.eval(
+            HOLD, 3, SlotHoldService._key(availability_id), SlotHoldService._session_key(session_id), HOLD_INDEX_KEY,
+            session_id, ttl_ms, availability_id, SLOT_KEY_PREFIX
+        ))
+
+    @staticmethod
+    def release(availability_id, token) -> bool:
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return False
+        session_id = SlotHoldService.session_id(token)
+        try:
+            return bool(redis_client.eval(
+                RELEASE, 3, SlotHoldService._key(availability_id), SlotHoldService._session_key(session_id), HOLD_INDEX_KEY,
+                session_id, availability_id
+            ))
+        except redis.RedisError as e:
+            print(f"Failed to release slot hold: {str(e)}")
+            return False
+
+    @staticmethod
+    def holder(availability_id) -> Optional[str]:
+        """Session id (see `session_id`) of the slot's holder, if any."""
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return None
+        try:
+            return redis_client.get(SlotHoldService._key(availability_id))  # type: ignore
+        except redis.RedisError:
+            return None
+
+    @staticmethod
+    def held_by_others(token) -> List[int]:
+        """Ids of the slots currently held by sessions other than `token`'s,
+        in one round trip, for listings to exclude in their query."""
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return []
+        try:
+            held = redis_client.eval(HELD_BY_OTHERS, 2, HOLD_INDEX_KEY, SlotHoldService._session_key(SlotHoldService.session_id(token)))
+        except redis.RedisError:
+            return []
+        return [int(availability_id) for availability_id in held]  # type: ignore
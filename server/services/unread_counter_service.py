@@ -0,0 +1,105 @@
+import os
+import redis
+from redis_connection import RedisClient
+from typing import Callable, Optional
+
+# The counter expires so any drift is reconciled from Postgres periodically
+UNREAD_COUNTER_TTL = int(os.getenv('NOTIFICATION_UNREAD_COUNTER_TTL_SECONDS', 3600))
+
+# How long a change to a missing counter keeps it from being rebuilt. Must
+# outlast a rebuild's count query, which may have read Postgres before the
+# change committed.
+UNREAD_COUNTER_DIRTY_MS = 5000
+
+# Adjust only an existing counter: INCRBY on a missing key would start it at
+# the delta instead of the real count. A missing counter is marked dirty
+# instead, so a rebuild already in flight does not store a count that misses
+# this change.
+# KEYS: counter, dirty marker; ARGV: delta, dirty ms
+ADJUST_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    local count = redis.call('incrby', KEYS[1], ARGV[1])
+    if count < 0 then
+        redis.call('set', KEYS[1], 0, 'KEEPTTL')
+    end
+    return 1
+end
+redis.call('set', KEYS[2], 1, 'PX', ARGV[2])
+return 0
+"""
+# KEYS: counter, dirty marker; ARGV: count, ttl (s)
+STORE_UNLESS_DIRTY = """
+if redis.call('exists', KEYS[2]) == 1 then
+    return 0
+end
+-- NX: a counter rebuilt concurrently by another request wins
+return redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) and 1 or 0
+"""
+
+class UnreadCounterService:
+    """Per-user unread notification count in Redis, so the inbox badge never
+    has to count rows in Postgres. Writes adjust it after they commit; a
+    missing (or expired) counter is rebuilt from Postgres on the next read."""
+
+    @staticmethod
+    def _key(user_id):
+        return f"notifications:unread:{user_id}"
+
+    @staticmethod
+    def _dirty_key(user_id):
+        return f"notifications:unread:{user_id}:dirty"
+
+    @staticmethod
+    def get(user_id, count_unread: Callable[[], int]) -> int:
+        redis_client = RedisClient.get_client()
+        if redis_client:
+            try:
+                cached = redis_client.get(UnreadCounterService._key(user_id))
+                if cached is not None:
+                    return int(cached)  # type: ignore
+            except redis.RedisError as e:
+                print(f"Failed to read unread counter: {str(e)}")
+                redis_client = None
+
+        count = count_unread()
+        if redis_client:
+            try:
+                # Not stored if the count changed while it was being read;
+                # the next read rebuilds it
+                redis_client.eval(
+                    STORE_UNLESS_DIRTY, 2, UnreadCounterService._key(user_id), UnreadCounterService._dirty_key(user_id),
+                    count, UNREAD_COUNTER_TTL
+                )
+            except redis.RedisError as e:
+                print(f"Failed to store unread counter: {str(e)}")
+        return count
+
+    @staticmethod
+    def adjust(user_id, delta) -> None:
+        redis_client = RedisClient.get_client()
+        if not redis_client or not delta:
+            return
+        try:
+            redis_client.eval(
+                ADJUST_IF_EXISTS, 2, UnreadCounterService._key(user_id), UnreadCounterService._dirty_key(user_id),
+                delta, UNREAD_COUNTER_DIRTY_MS
+            )
+        except redis.RedisError as e:
+            print(f"Failed to adjust unread counter: {str(e)}")
+
+    @staticmethod
+    def reset(user_id, count: Optional[int] = None) -> None:
+        """Drop the counter (rebuilt on next read), or set it to a known count."""
+        redis_client = RedisClient.get_client()
+        if not redis_client:
+            return
+        try:
+            if count is None:
+                pipe = redis_client.pipeline()
+                pipe.delete(UnreadCounterService._key(user_id))
+                pipe.set(UnreadCounterService._dirty_key(user_id), 1, px=UNREAD_COUNTER_DIRTY_MS)
+                pipe.execute()
+            else:
+                redis_client.set(UnreadCounterService._key(user_id), count, ex=UNREAD_COUNTER_TTL)
+        except redis.RedisError as e:
+            print(f"Failed to reset unread counter: {str(e)}")
@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask, jsonify
+from middleware.query_budget import QueryBudgetExceeded, query_budget, report_query_stats
+from utils.query_log import QueryLog
+
+def run_statements(count):
+    # Recorded like statements run through a DbPool cursor, without a database
+    for _ in range(count):
+        with QueryLog.timed("SELECT 1"):
+            pass
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.testing = True
+    app.after_request(report_query_stats)
+
+    @app.get('/within-budget')
+    @query_budget(2)
+    def within_budget():
+        run_statements(2)
+        return jsonify({"status": "success"}), 200
+
+    @app.get('/over-budget')
+    @query_budget(1)
+    def over_budget():
+        run_statements(2)
+        return jsonify({"status": "success"}), 200
+
+    return app.test_client()
+
+def test_route_within_budget_passes(client):
+    assert client.get('/within-budget').status_code == 200
+
+def test_route_over_budget_fails_in_testing(client):
+    with pytest.raises(QueryBudgetExceeded, match="ran 2 SQL statements, budget is 1"):
+        client.get('/over-budget')
@@ -0,0 +1,48 @@
+import base64
+import datetime as dt
+import json
+from db_connection import CompactRows
+
+def encode_cursor(*values):
+    """Opaque keyset cursor for the sort key of the last row of a page."""
+    payload = json.dumps([value.isoformat() if isinstance(value, dt.datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, *types):
+    """Inverse of `encode_cursor`; `types` (datetime or int) says how to read
+    each value back. Raises ValueError for anything that isn't our cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [
+            None if value is None else dt.datetime.fromisoformat(value) if kind is dt.datetime else kind(value)
+            for value, kind in zip(values, types)
+        ]
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+def desc_keyset_condition(sort_column, id_column, after):
+    """WHERE fragment and params for the rows following `after` = (sort value,
+    id) in `ORDER BY sort_column DESC, id_column DESC` order, for a nullable
+    sort column: DESC sorts NULLs first, so a NULL sort value is followed by
+    the remaining NULL rows and then every non-NULL one."""
+    value, last_id = after
+    if value is None:
+        return f"(({sort_column} IS NULL AND {id_column} < %s) OR {sort_column} IS NOT NULL)", [last_id]
+    return f"({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))", [value, value, last_id]
+
+def paginate(rows, limit, sort_key):
+    """Split a page fetched with LIMIT limit + 1 into (rows, next_cursor,
+    has_more); `sort_key(row)` gives the keyset values of a row as a dict.
+    `rows` can also be CompactRows."""
+    if isinstance(rows, CompactRows):
+        has_more = len(rows) > limit
+        page = CompactRows(rows.columns, rows.rows[:limit])
+        last = dict(zip(rows.columns, page.rows[-1])) if has_more else None
+    else:
+        has_more = len(rows) > limit
+        page = rows[:limit]
+        last = page[-1] if has_more else None
+    next_cursor = encode_cursor(*sort_key(last)) if has_more else None
+    return page, next_cursor, has_more
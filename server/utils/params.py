@@ -0,0 +1,27 @@
+import datetime as dt
+from utils.pagination import decode_cursor
+
+def parse_limit(value, default, maximum):
+    """`limit` query parameter: a positive int, capped at `maximum`."""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+def parse_date(value, name):
+    try:
+        return dt.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+def parse_page(args, default_limit, max_limit, *cursor_types):
+    """(limit, after) of a keyset-paginated listing from `limit` and the
+    opaque `cursor` of the previous page."""
+    limit = parse_limit(args.get('limit'), default_limit, max_limit)
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor, *cursor_types) if cursor else None
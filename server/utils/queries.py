@@ -8,6 +8,16 @@ def create_placeholder_data(data_dict, allowed_columns):
     placeholders = ','.join(['%s'] * len(filtered_data))
     return columns, placeholders, tuple(filtered_data.values())
 
+def create_values_list(rows, columns):
+    """Placeholders and flat parameters for a multi-row VALUES list, so many
+    rows go out in one statement. Keys missing from a row are NULL."""
+    if not rows:
+        raise ValueError("No rows provided")
+
+    row_placeholder = '(' + ','.join(['%s'] * len(columns)) + ')'
+    placeholders = ','.join([row_placeholder] * len(rows))
+    return placeholders, tuple(row.get(column) for row in rows for column in columns)
+
 def get_set_clause_and_values(data_dict, allowed_columns):
     set_clauses = []
     values = []
@@ -16,4 +26,14 @@ def get_set_clause_and_values(data_dict, allowed_columns):
             set_clauses.append(f"{key} = %s")
             values.append(data_dict[key])
     set_clause_str = ", ".join(set_clauses)
-    return set_clause_str, values
\ No newline at end of file
+    return set_clause_str, values
+
+def fetch_rows(cursor, query, params, stream=False, compact=False):
+    """Run a listing query and return its rows as dicts (default), as a
+    generator over a server-side cursor (`stream`) or as CompactRows (`compact`)."""
+    if stream:
+        return cursor.stream(query, params)
+    if compact:
+        return cursor.fetch_compact(query, params)
+    cursor.execute(query, params)
+    return cursor.fetchall()
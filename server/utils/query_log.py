@@ -0,0 +1,103 @@
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from flask import g, has_request_context, request
+
+ENABLED = os.getenv('SQL_INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+# The same statement text run this many times in one request (with any
+# parameters) is reported as a likely N+1 pattern
+REPEATED_QUERY_THRESHOLD = int(os.getenv('SQL_REPEATED_QUERY_THRESHOLD', 5))
+# Statements slower than this are logged with their parameter shape (never
+# the values); 0 disables the slow-query log
+SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', 500))
+SLOW_QUERY_EXPLAIN = os.getenv('SQL_SLOW_QUERY_EXPLAIN', 'false').lower() in ('1', 'true', 'yes')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+class QueryRecord:
+    __slots__ = ('sql', 'params', 'duration_ms', 'rows')
+
+    def __init__(self, sql, params):
+        self.sql = normalize_sql(sql)
+        self.params = params
+        self.duration_ms = 0.0
+        self.rows = -1
+
+def params_shape(params):
+    """Type names of the bound parameters, so slow queries can be logged
+    without writing patient data to the log."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+def log_slow_query(record, sql, explain=None):
+    route = f"{request.method} {request.path}: " if has_request_context() else ""
+    print(f"⚠ {route}slow query ({record.duration_ms:.1f} ms, {record.rows} rows): "
+          f"{record.sql} params={params_shape(record.params)}")
+    if explain is None or not SLOW_QUERY_EXPLAIN:
+        return
+    try:
+        for line in explain(sql, record.params):
+            print(f"    {line}")
+    except Exception as e:
+        print(f"    EXPLAIN failed: {e}")
+
+class QueryLog:
+    """Per-request record of every statement run through DbPool cursors."""
+
+    @staticmethod
+    @contextmanager
+    def timed(sql, params=None, explain=None):
+        """Time one statement. `explain(sql, params)` returns its plan lines
+        and is only called for slow statements that succeeded."""
+        record = QueryRecord(sql, params)
+        recording = ENABLED and has_request_context()
+        if not recording and not SLOW_QUERY_MS:
+            yield record
+            return
+
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            yield record
+            succeeded = True
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+            if recording:
+                if '_query_log' not in g:
+                    g._query_log = []
+                g._query_log.append(record)
+            if SLOW_QUERY_MS and record.duration_ms >= SLOW_QUERY_MS:
+                log_slow_query(record, sql, explain if succeeded else None)
+
+    @staticmethod
+    def entries():
+        if not has_request_context():
+            return []
+        return g.get('_query_log', [])
+
+    @staticmethod
+    def summary():
+        entries = QueryLog.entries()
+        identical = Counter((record.sql, repr(record.params)) for record in entries)
+        by_statement = Counter(record.sql for record in entries)
+        return {
+            "count": len(entries),
+            "total_ms": round(sum(record.duration_ms for record in entries), 3),
+            "rows": sum(max(record.rows, 0) for record in entries),
+            "duplicates": [
+                {"sql": sql, "times": times}
+                for (sql, _), times in identical.items() if times > 1
+            ],
+            "repeated": [
+                {"sql": sql, "times": times}
+                for sql, times in by_statement.items() if times >= REPEATED_QUERY_THRESHOLD
+            ],
+        }
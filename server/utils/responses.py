@@ -0,0 +1,27 @@
+from flask import Response, current_app, stream_with_context
+from db_connection import STREAM_ITERSIZE, CompactRows
+
+def stream_json_list(key, rows, chunk_size=STREAM_ITERSIZE):
+    """Stream `{"status": "success", key: [...]}` as a chunked JSON body,
+    serializing `chunk_size` rows at a time instead of the whole list."""
+    def generate():
+        yield f'{{"status": "success", "{key}": ['
+        chunk = []
+        separator = ''
+        for row in rows:
+            chunk.append(current_app.json.dumps(row))
+            if len(chunk) >= chunk_size:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def serialize_rows(rows):
+    """JSON-ready form of a listing: CompactRows become `{"columns": [...], "rows": [[...]]}`."""
+    if isinstance(rows, CompactRows):
+        return rows.to_dict()
+    return rows